@@ -0,0 +1,13 @@
+# Shared by the helper scripts (benchmark_parsers.py, shopify_stub_server.py) that drive the scraper.
+
+import os
+import importlib.util
+
+ANALYZER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zumiez_analyzer-grok3.py")
+
+def load_analyzer():
+    """Import zumiez_analyzer-grok3.py (its file name isn't a valid module name)"""
+    spec = importlib.util.spec_from_file_location("zumiez_analyzer", ANALYZER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
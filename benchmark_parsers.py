@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# Benchmark the Scraper.parse implementations against the checked-in *_debug_*.html captures.
+# Usage:
+#   python benchmark_parsers.py [--iterations N]    # throughput and memory per parser
+#   python benchmark_parsers.py --save-baseline     # record results as the local baseline
+#   python benchmark_parsers.py --check             # exit 1 if a parser regressed vs. the baseline
+#   python benchmark_parsers.py --compare-backends  # html.parser vs. lxml
+
+import gc
+import os
+import sys
+import json
+import time
+import statistics
+import logging
+import tracemalloc
+import argparse
+
+from analyzer_loader import load_analyzer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, "parse_benchmark_baseline.json")
+
+# A parser fails --check when it is this much slower (or uses this much more memory)
+DEFAULT_TOLERANCE = 0.25
+# --check times at least this many parses per capture, so its best time isn't a single sample
+CHECK_MIN_ITERATIONS = 5
+
+# (scraper class, store, part, capture file)
+FIXTURES = [
+    ("ZumiezScraper", "Zumiez", "Wheels", "zumiez_debug_wheels.html"),
+    ("ZumiezScraper", "Zumiez", "Trucks", "zumiez_debug_trucks.html"),
+    ("ZumiezScraper", "Zumiez", "Decks", "zumiez_debug_decks.html"),
+    ("SkateWarehouseScraper", "SkateWarehouse", "Wheels", "skatewarehouse_debug_wheels.html"),
+    ("SkateWarehouseScraper", "SkateWarehouse", "Trucks", "skatewarehouse_debug_trucks.html"),
+    ("SkateWarehouseScraper", "SkateWarehouse", "Bearings", "skatewarehouse_debug_bearings.html"),
+    ("SkateWarehouseScraper", "SkateWarehouse", "Decks", "skatewarehouse_debug_decks.html"),
+    ("CCSScraper", "CCS", "Wheels", "ccs_debug_wheels.html"),
+    ("CCSScraper", "CCS", "Decks", "ccs_debug_decks.html"),
+    ("TacticsDecksScraper", "Tactics", "Decks", "tactics_debug_decks.html"),
+]
+
+def make_scraper(analyzer, class_name, store, part):
+    cls = getattr(analyzer, class_name)
+    if class_name == "TacticsDecksScraper":
+        return cls()
+    return cls(store, "", part)
+
+def load_fixtures(analyzer):
+    fixtures = []
+    for class_name, store, part, filename in FIXTURES:
+        path = os.path.join(HERE, filename)
+        if not os.path.exists(path):
+            print(f"Skipping missing capture {filename}")
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            fixtures.append((make_scraper(analyzer, class_name, store, part), filename, f.read()))
+    return fixtures
+
+def time_parse(scraper, html, iterations):
+    """Return (best seconds per parse, products parsed)"""
+    best = float("inf")
+    products = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        products = scraper.parse(html)
+        best = min(best, time.perf_counter() - start)
+    return best, len(products)
+
+def measure_memory(scraper, html):
+    """
+    Return (peak bytes during one parse, blocks allocated by it). The cyclic GC is
+    paused so the DOM's nodes are still counted after parse() returns.
+    """
+    gc.collect()
+    gc.disable()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        products = scraper.parse(html)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        allocated = sys.getallocatedblocks() - blocks_before
+        gc.enable()
+    del products
+    gc.collect()
+    return peak, allocated
+
+def benchmark(fixtures, iterations):
+    """Parse every capture `iterations` times and collect throughput and memory per capture"""
+    results = {}
+    for scraper, filename, html in fixtures:
+        scraper.parse(html)  # warm-up
+        gc.collect()
+        products = 0
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            products += len(scraper.parse(html))
+            times.append(time.perf_counter() - start)
+        elapsed = sum(times)
+        peak, allocated = measure_memory(scraper, html)
+        results[filename] = {
+            "parser": type(scraper).__name__,
+            "pages_per_s": iterations / elapsed,
+            "products_per_s": products / elapsed,
+            "ms_per_page": elapsed / iterations * 1000,
+            "best_ms": min(times) * 1000,
+            "median_ms": statistics.median(times) * 1000,
+            "peak_kib": peak / 1024,
+            "allocated_blocks": allocated,
+        }
+    return results
+
+def print_results(results, iterations):
+    print(f"Parse throughput ({iterations} iterations per capture)")
+    print(f"{'capture':<36}{'parser':<24}{'ms/page':>9}{'best ms':>9}{'pages/s':>9}{'prods/s':>10}{'peak KiB':>10}{'blocks':>8}")
+    for filename, r in results.items():
+        print(f"{filename:<36}{r['parser']:<24}{r['ms_per_page']:>9.1f}{r['best_ms']:>9.1f}{r['pages_per_s']:>9.2f}"
+              f"{r['products_per_s']:>10.1f}{r['peak_kib']:>10.0f}{r['allocated_blocks']:>8}")
+
+def check_against_baseline(results, baseline, tolerance):
+    """
+    Return a list of regressions compared to the stored baseline. Speed is judged on
+    the best time per parse, which one-off stalls (GC, a busy CI runner) can't inflate
+    the way they inflate a mean.
+    """
+    failures = []
+    for filename, r in results.items():
+        base = baseline.get(filename)
+        if not base:
+            continue
+        if "best_ms" not in base:
+            print(f"{filename}: baseline has no best time per parse; re-run --save-baseline to check speed")
+        elif r["best_ms"] > base["best_ms"] * (1 + tolerance):
+            failures.append(f"{filename}: best {r['best_ms']:.1f} ms/page vs. baseline {base['best_ms']:.1f}")
+        if r["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+            failures.append(f"{filename}: peak {r['peak_kib']:.0f} KiB vs. baseline {base['peak_kib']:.0f} KiB")
+        if r["allocated_blocks"] > base["allocated_blocks"] * (1 + tolerance):
+            failures.append(f"{filename}: {r['allocated_blocks']} blocks vs. baseline {base['allocated_blocks']}")
+    return failures
+
+def compare_backends(analyzer, fixtures, iterations):
+    backends = [name for name in ["html.parser", "lxml"] if analyzer.builder_registry.lookup(name)]
+    print(f"Parser backends: {', '.join(backends)} ({iterations} iterations, best time)")
+    print(f"{'capture':<38}" + "".join(f"{b:>14}" for b in backends) + f"{'speedup':>10}")
+
+    totals = {b: 0.0 for b in backends}
+    for scraper, filename, html in fixtures:
+        row = {}
+        for backend in backends:
+            scraper.parser_backend = backend
+            row[backend], _ = time_parse(scraper, html, iterations)
+            totals[backend] += row[backend]
+        scraper.parser_backend = None
+        speedup = row["html.parser"] / row[backends[-1]] if row[backends[-1]] else 0
+        print(f"{filename:<38}" + "".join(f"{row[b] * 1000:>12.1f}ms" for b in backends) + f"{speedup:>9.1f}x")
+
+    speedup = totals["html.parser"] / totals[backends[-1]] if totals[backends[-1]] else 0
+    print(f"{'total':<38}" + "".join(f"{totals[b] * 1000:>12.1f}ms" for b in backends) + f"{speedup:>9.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Scraper.parse on the debug HTML captures")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--compare-backends", action="store_true", help="time html.parser against lxml")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {os.path.basename(BASELINE_FILE)}")
+    parser.add_argument("--check", action="store_true", help="fail if any parser regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    analyzer = load_analyzer()
+    logging.disable(logging.CRITICAL)
+    fixtures = load_fixtures(analyzer)
+
+    if args.compare_backends:
+        compare_backends(analyzer, fixtures, args.iterations)
+        return 0
+
+    iterations = args.iterations
+    if args.check and iterations < CHECK_MIN_ITERATIONS:
+        print(f"--check needs at least {CHECK_MIN_ITERATIONS} iterations; using {CHECK_MIN_ITERATIONS}")
+        iterations = CHECK_MIN_ITERATIONS
+    results = benchmark(fixtures, iterations)
+    print_results(results, iterations)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {BASELINE_FILE}")
+
+    if args.check:
+        if not os.path.exists(BASELINE_FILE):
+            print(f"No baseline at {BASELINE_FILE}; run with --save-baseline first")
+            return 1
+        with open(BASELINE_FILE, 'r') as f:
+            baseline = json.load(f)
+        failures = check_against_baseline(results, baseline, args.tolerance)
+        if failures:
+            print("Parser regressions:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print(f"All parsers within {args.tolerance:.0%} of baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Serve recorded Shopify products.json pages locally, to exercise CCSScraper's JSON path offline.
+# Usage:
+#   python shopify_stub_server.py [--port N]   # serve ccs_products_*.json until interrupted
+#   python shopify_stub_server.py --check      # run the JSON path against it and compare its links with the HTML captures
+
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from analyzer_loader import load_analyzer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (part, collection path as on shop.ccs.com, recorded products.json, HTML capture of the same listing)
+FIXTURES = [
+    ("Wheels", "/collections/clearance/skateboard-wheels", "ccs_products_wheels.json", "ccs_debug_wheels.html"),
+]
+
+def load_recorded():
+    """{collection path: [product]} from the recorded products.json files"""
+    recorded = {}
+    for _, collection, filename, _ in FIXTURES:
+        with open(os.path.join(HERE, filename), 'r', encoding='utf-8') as f:
+            recorded[collection] = json.load(f)["products"]
+    return recorded
+
+def make_handler(recorded):
+    class ProductsJSONHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            collection = parts.path[:-len("/products.json")] if parts.path.endswith("/products.json") else None
+            if collection not in recorded:
+                self.send_error(404)
+                return
+            query = parse_qs(parts.query)
+            page = int(query.get("page", ["1"])[0])
+            limit = int(query.get("limit", ["30"])[0])
+            products = recorded[collection][(page - 1) * limit:page * limit]
+            body = json.dumps({"products": products}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return ProductsJSONHandler
+
+def start_server(port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(load_recorded()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def check():
+    """Return a list of mismatches between the JSON path and the HTML captures' product links"""
+    analyzer = load_analyzer()
+    logging.disable(logging.CRITICAL)
+    # Compare everything the fixtures hold, not just the brands PRODUCT_FILTERS keeps
+    analyzer.FILTERS = {}
+    server = start_server()
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    failures = []
+    try:
+        for part, collection, filename, capture in FIXTURES:
+            scraper = analyzer.CCSScraper("CCS", origin + collection, part)
+            json_products = scraper.fetch_products_json()
+            if json_products is None:
+                failures.append(f"{filename}: JSON path returned nothing")
+                continue
+            json_paths = {urlsplit(p.url).path for p in json_products}
+            # The listing's product links; parse() selectors don't match this capture's markup
+            with open(os.path.join(HERE, capture), 'r', encoding='utf-8') as f:
+                html_paths = set(re.findall(r'href="(/collections/[^"/]+/products/[^"?#]+)"', f.read()))
+            print(f"{filename}: {len(json_paths)} products from JSON, {len(html_paths)} product links in {capture}")
+            for path in sorted(json_paths ^ html_paths):
+                failures.append(f"{filename}: {path} only in {'JSON' if path in json_paths else capture}")
+    finally:
+        server.shutdown()
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded Shopify products.json pages for CCSScraper")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--check", action="store_true", help="run the JSON path against the stub and compare URLs with the HTML captures")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check()
+        for failure in failures:
+            print(f"  {failure}")
+        print("JSON and HTML paths agree" if not failures else "JSON and HTML paths disagree")
+        return 1 if failures else 0
+
+    server = start_server(args.port)
+    print(f"Serving {', '.join(c for _, c, _, _ in FIXTURES)} at http://127.0.0.1:{args.port} (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
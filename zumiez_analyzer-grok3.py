@@ -2,6 +2,7 @@
 # Requirements: requests, beautifulsoup4, selenium, webdriver-manager, fake-useragent
 # Install with:
 #   pip install requests beautifulsoup4 selenium webdriver-manager fake-useragent
+# Optional: lxml (faster HTML parsing; html.parser is used when it's missing)
 
 import os
 import re
@@ -13,8 +14,24 @@ import requests
 import datetime
 import string
 import uuid
+import hashlib
+import gzip
+from html import escape
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 import shutil
-from bs4 import BeautifulSoup
+import tempfile
+import sqlite3
+import sys
+import threading
+import subprocess
+import contextlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -23,40 +40,130 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from fake_useragent import UserAgent
+try:
+    import zstandard  # optional; debug captures are gzipped without it
+except ImportError:
+    zstandard = None
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-def safe_write_file(filename, content, mode='w'):
-    """Write content to file with permission error handling"""
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+
+# WebDriver pool settings (overridable from the environment)
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "4"))
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", "20"))
+
+# Concurrency settings: scrapers run in parallel, at most K page loads per host
+MAX_PAGES_PER_HOST = int(os.getenv("MAX_PAGES_PER_HOST", "1"))
+
+# Politeness per host as (requests per second, burst); other hosts use DEFAULT_RATE_LIMIT.
+# Waits are padded with up to RATE_LIMIT_JITTER seconds of random jitter.
+DEFAULT_RATE_LIMIT = (0.5, 2)
+SITE_RATE_LIMITS = {
+    "www.zumiez.com": (0.25, 1),
+    "www.skatewarehouse.com": (0.5, 2),
+    "shop.ccs.com": (1.0, 3),
+    "www.tactics.com": (0.5, 2),
+}
+RATE_LIMIT_JITTER = float(os.getenv("RATE_LIMIT_JITTER", "1.0"))
+
+# Browser page settling: how long the page must be idle, and the most we wait for it
+SCROLL_QUIET_MS = int(os.getenv("SCROLL_QUIET_MS", "750"))
+SCROLL_SETTLE_TIMEOUT = int(os.getenv("SCROLL_SETTLE_TIMEOUT", "6"))
+
+# Plain HTTP fetch settings for scrapers that don't need a browser
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))
+
+# Shopify products.json paging (CCS)
+SHOPIFY_PAGE_LIMIT = 250
+SHOPIFY_MAX_PAGES = 20
+
+# BeautifulSoup tree builder: "auto" uses lxml when installed, else html.parser
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+# Build only the product-container subtrees of a page instead of the full DOM
+PREFILTER_HTML = os.getenv("PREFILTER_HTML", "true").lower() == "true"
+
+# Which products are kept, per part: "brands" (any must appear in the name),
+# "min_discount" (% off), "min_price"/"max_price". PRODUCT_FILTERS_FILE may
+# point to a JSON file with the same shape to override these.
+PRODUCT_FILTERS = {
+    "Wheels": {"brands": ["Bones", "Powell", "Spitfire", "OJ"]},
+    "Trucks": {"brands": ["Independent", "Indy", "Ace"]},
+    "Decks": {"min_discount": 30},
+}
+PRODUCT_FILTERS_FILE = os.getenv("PRODUCT_FILTERS_FILE", "product_filters.json")
+
+# Snapshot of the last run that compare() diffs against, one JSON record per line
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "previous_data.jsonl")
+# Single-document snapshot written by older versions, read only until SNAPSHOT_FILE exists
+LEGACY_SNAPSHOT_FILE = "previous_data.json"
+
+# How generate_html_chart lays out the report: "inline" embeds every table's rows in the
+# page; "sharded" writes a small page plus report.css/report.js and one JSON file per
+# site key into REPORT_DATA_DIR, fetched when a section is opened (the page must then be
+# served over HTTP, e.g. GitHub Pages, rather than opened from disk)
+REPORT_MODE = os.getenv("REPORT_MODE", "inline")
+REPORT_DATA_DIR = os.getenv("REPORT_DATA_DIR", "report_data")
+
+# Raw pages kept for debugging: "off", "on-failure" (only pages that parsed zero
+# products) or "always". They are stored compressed and deduplicated under CAPTURE_DIR,
+# with the last CAPTURE_HISTORY captures of each site kept (0 keeps none).
+DEBUG_CAPTURE = os.getenv("DEBUG_CAPTURE", "on-failure")
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+CAPTURE_HISTORY = int(os.getenv("CAPTURE_HISTORY", "10"))
+
+# Append-only SQLite log of price observations, added for each site whose items changed
+HISTORY_DB = os.getenv("HISTORY_DB", "price_history.sqlite3")
+
+# JSON-lines journal of every change compare() detects, one line per change
+CHANGE_JOURNAL = os.getenv("CHANGE_JOURNAL", "change_journal.jsonl")
+
+# Where the resolved chromedriver path is remembered between runs
+CHROMEDRIVER_CACHE = os.getenv("CHROMEDRIVER_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "salesscraper", "chromedriver.json"))
+
+def fsync_directory(path):
+    """Flush the directory entry for path, so a rename into it survives a crash"""
     try:
-        # Try using the current directory
-        with open(filename, mode, encoding='utf-8') as f:
-            f.write(content)
-        logging.info(f"Successfully wrote to file: {filename}")
-        return True
-    except (IOError, PermissionError) as e:
-        logging.error(f"Permission error writing to {filename}: {e}")
-        
-        # Try using /tmp as fallback
-        try:
-            tmp_filename = os.path.join('/tmp', os.path.basename(filename))
-            with open(tmp_filename, mode, encoding='utf-8') as f:
-                f.write(content)
-            logging.info(f"Wrote to alternate location: {tmp_filename}")
-            
-            # If successful, try to copy back to original location
-            try:
-                shutil.copy(tmp_filename, filename)
-                logging.info(f"Copied from {tmp_filename} to {filename}")
-                return True
-            except Exception as copy_error:
-                logging.error(f"Couldn't copy from temp to original: {copy_error}")
-                return False
-        except Exception as tmp_error:
-            logging.error(f"Could not write to temp location either: {tmp_error}")
-            return False
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return  # directories can't be opened on every platform
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def atomic_open(filename, buffering=-1, binary=False):
+    """
+    Open a temp file beside filename for writing (bytes if binary). On a clean exit it is fsynced and
+    renamed into place, so readers see either the old file or the complete new one,
+    never a truncated one; on an exception it is deleted.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, 'wb' if binary else 'w', buffering=buffering, encoding=None if binary else 'utf-8') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+    fsync_directory(filename)
+
+def atomic_write_file(filename, content):
+    """Replace filename with content atomically (see atomic_open)"""
+    with atomic_open(filename) as f:
+        f.write(content)
 
 def create_chrome_temp_dir():
     """Create a properly permissioned temporary directory for Chrome"""
@@ -76,7 +183,6 @@ def create_chrome_temp_dir():
         
         # Fallback to using tempfile module
         try:
-            import tempfile
             alt_temp_dir = tempfile.mkdtemp(prefix='chrome_data_')
             os.chmod(alt_temp_dir, 0o777)
             logging.info(f"Created alternate temp dir: {alt_temp_dir}")
@@ -85,187 +191,484 @@ def create_chrome_temp_dir():
             logging.error(f"Failed to create alternate temp dir: {alt_e}")
             return None
 
-def fetch_page(url, max_retries=3, timeout=30):
-    ua = UserAgent()
+def get_major_version(binary):
+    """Return the major version reported by `<binary> --version`, or None"""
+    try:
+        output = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except Exception as e:
+        logging.warning(f"Could not get version of {binary}: {e}")
+        return None
+    match = re.search(r"(\d+)\.\d+\.\d+", output)
+    return match.group(1) if match else None
+
+def get_chrome_major_version():
+    """Find the installed Chrome/Chromium and return its major version"""
+    for candidate in ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser"]:
+        binary = shutil.which(candidate)
+        if binary:
+            return get_major_version(binary)
+    logging.warning("Could not find an installed Chrome binary")
+    return None
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+def resolve_chromedriver_path():
+    """
+    Resolve the chromedriver binary once per process. The result is cached on disk
+    and reused while it still matches the installed Chrome's major version, so
+    later runs skip webdriver-manager entirely and work offline.
+    """
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path:
+            return _chromedriver_path
+
+        chrome_version = get_chrome_major_version()
+        cached_path = None
+        try:
+            if os.path.exists(CHROMEDRIVER_CACHE):
+                with open(CHROMEDRIVER_CACHE, 'r') as f:
+                    cached_path = json.load(f).get("path")
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable chromedriver cache {CHROMEDRIVER_CACHE}: {e}")
+
+        if cached_path and os.path.exists(cached_path):
+            driver_version = get_major_version(cached_path)
+            if chrome_version is None or driver_version == chrome_version:
+                logging.info(f"Using cached chromedriver at {cached_path}")
+                _chromedriver_path = cached_path
+                return _chromedriver_path
+            logging.info(f"Cached chromedriver is version {driver_version}, Chrome is {chrome_version}; resolving again")
+
+        try:
+            path = ChromeDriverManager().install()
+        except Exception as e:
+            if cached_path and os.path.exists(cached_path):
+                logging.warning(f"Failed to install ChromeDriver ({e}), falling back to cached {cached_path}")
+                _chromedriver_path = cached_path
+                return _chromedriver_path
+            raise
+
+        try:
+            os.makedirs(os.path.dirname(CHROMEDRIVER_CACHE), exist_ok=True)
+            with open(CHROMEDRIVER_CACHE, 'w') as f:
+                json.dump({"path": path, "chrome_version": chrome_version}, f)
+        except Exception as e:
+            logging.warning(f"Could not write chromedriver cache {CHROMEDRIVER_CACHE}: {e}")
+
+        _chromedriver_path = path
+        return _chromedriver_path
+
+def build_chrome_options(user_agent, temp_dir):
+    """Build the Chrome options shared by every WebDriver we launch"""
+    options = Options()
     
-    for attempt in range(max_retries):
-        user_agent = ua.random
-        logging.info(f"Using user agent: {user_agent}")
+    # Set headless mode for CI environment
+    if os.getenv("CI", "false").lower() == "true":
+        options.add_argument("--headless=new")
+        logging.info("Running in headless mode for CI")
+    
+    # Essential Chrome options
+    options.add_argument(f"user-agent={user_agent}")
+    options.add_argument(f"--user-data-dir={temp_dir}")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-notifications")
+    options.add_argument("--disable-web-security")
+    options.add_argument("--allow-running-insecure-content")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--disable-infobars")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--no-first-run")
+    options.add_argument("--no-default-browser-check")
+    options.add_argument("--disable-popup-blocking")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    
+    # Add CI-specific options
+    if os.getenv("CI"):
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--remote-debugging-port=0")
+        logging.info("Added CI-specific options")
+
+    return options
+
+class PooledDriver:
+    """A live Chrome WebDriver together with the profile directory it owns"""
+    def __init__(self, driver, temp_dir):
+        self.driver = driver
+        self.temp_dir = temp_dir
+        self.pages_served = 0
+        self.recycle = False
+
+    def is_healthy(self):
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception as e:
+            logging.warning(f"WebDriver failed health check: {e}")
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+            logging.info("WebDriver closed successfully")
+        except Exception as e:
+            logging.warning(f"Error quitting driver: {e}")
 
+        # Clean up the temp directory
+        try:
+            if self.temp_dir and os.path.exists(self.temp_dir):
+                shutil.rmtree(self.temp_dir)
+                logging.info(f"Removed temp directory: {self.temp_dir}")
+        except Exception as e:
+            logging.warning(f"Failed to remove temp directory: {e}")
+
+class DriverPool:
+    """
+    Keep Chrome instances alive across fetches instead of launching one per URL.
+    Drivers are recycled when they fail a health check, after max_pages pages,
+    or when marked for recycling (e.g. after a Stash redirect).
+    """
+    def __init__(self, size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.user_agents = UserAgent()
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _spawn(self):
         # Create a properly permissioned temporary directory
         temp_dir = create_chrome_temp_dir()
         if not temp_dir:
-            logging.error("Could not create temp directory, skipping attempt")
-            time.sleep(2)
-            continue
+            raise WebDriverException("Could not create temp directory for Chrome")
 
-        options = Options()
-        
-        # Set headless mode for CI environment
-        if os.getenv("CI", "false").lower() == "true":
-            options.add_argument("--headless=new")
-            logging.info("Running in headless mode for CI")
-        
-        # Essential Chrome options
-        options.add_argument(f"user-agent={user_agent}")
-        options.add_argument(f"--user-data-dir={temp_dir}")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-notifications")
-        options.add_argument("--disable-web-security")
-        options.add_argument("--allow-running-insecure-content")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--disable-infobars")
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument("--no-first-run")
-        options.add_argument("--no-default-browser-check")
-        options.add_argument("--disable-popup-blocking")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        
-        # Add CI-specific options
-        if os.getenv("CI"):
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--remote-debugging-port=0")
-            logging.info("Added CI-specific options")
-
-        # Use webdriver-manager to get the Chromedriver path
+        options = build_chrome_options(self.user_agents.random, temp_dir)
+
+        # Resolved once per process and shared by every driver
         try:
-            chromedriver_path = ChromeDriverManager().install()
+            chromedriver_path = resolve_chromedriver_path()
             service = Service(executable_path=chromedriver_path)
             logging.info(f"Using chromedriver at {service.path}")
         except Exception as e:
             logging.error(f"Failed to install ChromeDriver: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(2 ** attempt)
-                continue
-            else:
-                return None
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
 
-        driver = None
+        # Initialize WebDriver
+        driver_attempts = 3
+        for driver_attempt in range(driver_attempts):
+            try:
+                logging.info(f"Initializing WebDriver (Attempt {driver_attempt + 1})")
+                driver = webdriver.Chrome(service=service, options=options)
+                logging.info("WebDriver initialized successfully")
+                return PooledDriver(driver, temp_dir)
+            except TimeoutException as e:
+                logging.error(f"TimeoutException during WebDriver init: {e}")
+                if driver_attempt < driver_attempts - 1:
+                    time.sleep(5)
+                    continue
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+            except WebDriverException as e:
+                logging.error(f"WebDriverException during WebDriver init: {e}")
+                
+                # Handle specific error cases
+                if "user data directory is already in use" in str(e):
+                    logging.warning("User data directory issue, creating a fresh one")
+                    # Try to clean up the directory
+                    try:
+                        if temp_dir and os.path.exists(temp_dir):
+                            shutil.rmtree(temp_dir)
+                        temp_dir = create_chrome_temp_dir()
+                        options.add_argument(f"--user-data-dir={temp_dir}")
+                    except Exception as cleanup_error:
+                        logging.error(f"Failed to clean up user data dir: {cleanup_error}")
+                
+                if "cannot find Chrome binary" in str(e):
+                    logging.error("Ensure Chrome is correctly installed and in the system's PATH")
+                    
+                if driver_attempt < driver_attempts - 1:
+                    time.sleep(5)
+                    continue
+                if temp_dir:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+
+    def acquire(self):
+        """Borrow a healthy driver, launching a new one if none are idle"""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    return self._spawn()
+                if pooled.is_healthy():
+                    return pooled
+                pooled.quit()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, pooled):
+        """Return a driver to the pool, or quit it if it is due for recycling"""
         try:
-            logging.info(f"Fetching {url} (Attempt {attempt + 1})")
-            
-            # Initialize WebDriver
-            driver_attempts = 3
-            for driver_attempt in range(driver_attempts):
+            if pooled.pages_served >= self.max_pages:
+                logging.info(f"Recycling WebDriver after {pooled.pages_served} pages")
+                pooled.recycle = True
+            if not pooled.recycle and not self._closed:
                 try:
-                    logging.info(f"Initializing WebDriver (Attempt {driver_attempt + 1})")
-                    driver = webdriver.Chrome(service=service, options=options)
-                    logging.info("WebDriver initialized successfully")
-                    break
-                except TimeoutException as e:
-                    logging.error(f"TimeoutException during WebDriver init: {e}")
-                    if driver_attempt < driver_attempts - 1:
-                        time.sleep(5)
-                        continue
-                    else:
-                        raise
-                except WebDriverException as e:
-                    logging.error(f"WebDriverException during WebDriver init: {e}")
-                    
-                    # Handle specific error cases
-                    if "user data directory is already in use" in str(e):
-                        logging.warning("User data directory issue, creating a fresh one")
-                        # Try to clean up the directory
-                        try:
-                            if temp_dir and os.path.exists(temp_dir):
-                                shutil.rmtree(temp_dir)
-                            temp_dir = create_chrome_temp_dir()
-                            options.add_argument(f"--user-data-dir={temp_dir}")
-                        except Exception as cleanup_error:
-                            logging.error(f"Failed to clean up user data dir: {cleanup_error}")
-                    
-                    if "cannot find Chrome binary" in str(e):
-                        logging.error("Ensure Chrome is correctly installed and in the system's PATH")
-                        
-                    if driver_attempt < driver_attempts - 1:
-                        time.sleep(5)
-                        continue
-                    else:
-                        raise
+                    # Match the old fresh-profile-per-fetch behaviour
+                    pooled.driver.delete_all_cookies()
+                except Exception as e:
+                    logging.warning(f"Could not reset WebDriver session: {e}")
+                    pooled.recycle = True
+            with self._lock:
+                keep = not pooled.recycle and not self._closed
+                if keep:
+                    self._idle.append(pooled)
+            if not keep:
+                pooled.quit()
+        finally:
+            self._slots.release()
 
-            if not driver:
-                logging.error("Failed to initialize WebDriver after multiple attempts")
-                continue
+    @contextlib.contextmanager
+    def borrow(self):
+        pooled = self.acquire()
+        try:
+            yield pooled
+        except Exception:
+            pooled.recycle = True
+            raise
+        finally:
+            self.release(pooled)
+
+    def close(self):
+        """Quit every idle driver; drivers still borrowed are quit on release"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.quit()
+        logging.info(f"Closed WebDriver pool ({len(idle)} drivers)")
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() only sleeps once the burst budget is spent"""
+    def __init__(self, rate, burst, jitter=0.0):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.jitter = jitter
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate + random.uniform(0, self.jitter)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+class HostLimiter:
+    """
+    Per-host politeness across scraper threads: at most max_per_host requests in
+    flight, paced by a token bucket from SITE_RATE_LIMITS. Waiting on one host
+    never blocks requests to another.
+    """
+    def __init__(self, max_per_host=MAX_PAGES_PER_HOST, rate_limits=None, jitter=RATE_LIMIT_JITTER):
+        self.max_per_host = max(1, max_per_host)
+        self.rate_limits = SITE_RATE_LIMITS if rate_limits is None else rate_limits
+        self.jitter = jitter
+        self._semaphores = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _host_state(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                rate, burst = self.rate_limits.get(host, DEFAULT_RATE_LIMIT)
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+                self._buckets[host] = TokenBucket(rate, burst, self.jitter)
+            return self._semaphores[host], self._buckets[host]
+
+    @contextlib.contextmanager
+    def slot(self, url):
+        host = urlsplit(url).hostname or ""
+        semaphore, bucket = self._host_state(host)
+        with semaphore:
+            delay = bucket.acquire()
+            if delay > 0:
+                logging.info(f"Waited {delay:.1f}s for {host} rate limit")
+            yield
+
+# Matches product listings on every site we scrape
+PRODUCT_SELECTOR = "li.ProductCard, .product-card, .product-item, a[href*='deck'], a[href*='wheels'], a[href*='truck'], a[href*='bearings']"
+
+# Installs a MutationObserver/PerformanceObserver once per page and returns how
+# many milliseconds have passed since the last DOM change or network request
+PAGE_QUIET_JS = """
+if (!window.__scraperActivity) {
+    window.__scraperActivity = {last: performance.now()};
+    const bump = () => { window.__scraperActivity.last = performance.now(); };
+    new MutationObserver(bump).observe(document.documentElement, {childList: true, subtree: true});
+    try { new PerformanceObserver(bump).observe({type: 'resource'}); } catch (e) {}
+}
+return performance.now() - window.__scraperActivity.last;
+"""
+
+COUNT_PRODUCTS_JS = "return document.querySelectorAll(arguments[0]).length;"
+
+# Scroll to the bottom and restart the quiet clock, so wait_for_quiet() measures from the
+# scroll rather than from activity that settled before it
+SCROLL_JS = """
+if (window.__scraperActivity) { window.__scraperActivity.last = performance.now(); }
+window.scrollTo(0, document.body.scrollHeight);
+"""
+
+def wait_for_quiet(driver, quiet_ms=SCROLL_QUIET_MS, timeout=SCROLL_SETTLE_TIMEOUT):
+    """Wait until the page has gone quiet_ms without DOM mutations or network activity"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.2).until(
+            lambda d: d.execute_script(PAGE_QUIET_JS) >= quiet_ms
+        )
+        return True
+    except TimeoutException:
+        logging.info(f"Page still busy after {timeout}s, continuing")
+        return False
 
-            # Set page load timeout
-            driver.set_page_load_timeout(timeout)
-            
-            # Introduce randomized delay before loading page
-            time.sleep(random.uniform(1, 3))
-            
-            # Navigate to the URL
-            driver.get(url)
-            
-            # Wait for page to be fully loaded
-            WebDriverWait(driver, timeout).until(
-                lambda d: d.execute_script("return document.readyState") == "complete"
-            )
+def scroll_until_stable(driver, product_selector, max_scroll_attempts=8):
+    """Scroll until the product count stops growing; returns False on a Stash redirect"""
+    previous_item_count = 0
+    for scroll_attempt in range(max_scroll_attempts):
+        # Scroll to bottom and wait for whatever it triggers to settle
+        driver.execute_script(SCROLL_JS)
+        wait_for_quiet(driver)
+
+        # Count items; if nothing new has shown up yet, give the lazy load until the
+        # settle timeout to add some before deciding the listing has ended
+        current_items = driver.execute_script(COUNT_PRODUCTS_JS, product_selector)
+        if current_items == previous_item_count and current_items > 0:
+            try:
+                WebDriverWait(driver, SCROLL_SETTLE_TIMEOUT, poll_frequency=0.2).until(
+                    lambda d: d.execute_script(COUNT_PRODUCTS_JS, product_selector) > previous_item_count
+                )
+                wait_for_quiet(driver)
+                current_items = driver.execute_script(COUNT_PRODUCTS_JS, product_selector)
+            except TimeoutException:
+                pass
+        logging.info(f"Scroll attempt {scroll_attempt + 1}: found {current_items} items")
+
+        # Check for redirects
+        if "stash" in driver.current_url.lower():
+            return False
 
-            # Additional wait for any JavaScript to finish
-            time.sleep(random.uniform(3, 5))
-            logging.info("Initial wait for dynamic content")
+        # If no new items loaded, we've reached the end
+        if current_items == previous_item_count and current_items > 0:
+            logging.info("No more items to load")
+            break
 
-            # Check if we've been redirected to an undesired page
-            current_url = driver.current_url
-            if "stash" in current_url.lower():
-                logging.error("Redirected to Stash page, retrying")
-                driver.quit()
-                continue
+        previous_item_count = current_items
+    return True
 
-            # Wait for product elements to appear
-            try:
-                WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "li.ProductCard, .product-card, .product-item, a[href*='deck'], a[href*='wheels'], a[href*='truck'], a[href*='bearings']"))
-                )
-                logging.info("Product listings detected")
-            except Exception as e:
-                logging.warning(f"Could not detect product listings: {e}")
-
-            # Infinite scroll implementation
-            logging.info("Attempting infinite scroll")
-            max_scroll_attempts = 8
-            scroll_attempts = 0
-            previous_item_count = 0
-
-            while scroll_attempts < max_scroll_attempts:
-                # Scroll to bottom
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(random.uniform(2, 4))
-                
-                # Count items
-                current_items = len(driver.find_elements(By.CSS_SELECTOR, "li.ProductCard, .product-card, .product-item, a[href*='deck'], a[href*='wheels'], a[href*='truck'], a[href*='bearings']"))
-                logging.info(f"Scroll attempt {scroll_attempts + 1}: found {current_items} items")
+def fetch_page(url, max_retries=3, timeout=30, pool=None, limiter=None, scroll=True, product_selector=PRODUCT_SELECTOR):
+    if pool is None:
+        # Standalone call: use a private single-driver pool for this URL
+        with DriverPool(size=1) as own_pool:
+            return fetch_page(url, max_retries, timeout, pool=own_pool, limiter=limiter,
+                              scroll=scroll, product_selector=product_selector)
+    if limiter is None:
+        limiter = HostLimiter()
 
-                # Check for redirects
-                current_url = driver.current_url
-                if "stash" in current_url.lower():
-                    logging.error("Redirected to Stash page during scrolling")
-                    driver.quit()
-                    return None
+    for attempt in range(max_retries):
+        try:
+            # Take the host slot before the driver so waiting never pins a browser
+            with limiter.slot(url), pool.borrow() as pooled:
+                driver = pooled.driver
 
-                # If no new items loaded, we've reached the end
-                if current_items == previous_item_count and current_items > 0:
-                    logging.info("No more items to load")
-                    break
+                # Rotate the user agent per fetch even though the browser is reused
+                user_agent = pool.user_agents.random
+                logging.info(f"Using user agent: {user_agent}")
+                try:
+                    driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+                except Exception as e:
+                    logging.warning(f"Could not override user agent: {e}")
 
-                previous_item_count = current_items
-                scroll_attempts += 1
+                logging.info(f"Fetching {url} (Attempt {attempt + 1})")
 
-            # Final wait for any AJAX requests to complete
-            time.sleep(random.uniform(2, 4))
-            logging.info("Final wait for AJAX content")
+                # Set page load timeout
+                driver.set_page_load_timeout(timeout)
+                
+                # Navigate to the URL
+                driver.get(url)
+                pooled.pages_served += 1
+                
+                # Wait for page to be fully loaded
+                WebDriverWait(driver, timeout).until(
+                    lambda d: d.execute_script("return document.readyState") == "complete"
+                )
+
+                # Additional wait for any JavaScript to finish
+                wait_for_quiet(driver)
+                logging.info("Initial wait for dynamic content")
 
-            # Scroll back to top
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(random.uniform(1, 2))
+                # Check if we've been redirected to an undesired page
+                current_url = driver.current_url
+                if "stash" in current_url.lower():
+                    logging.error("Redirected to Stash page, retrying")
+                    pooled.recycle = True
+                    continue
 
-            # Get the page source
-            html = driver.page_source
-            logging.info(f"Successfully fetched {url}")
-            return html
+                # Wait for product elements to appear
+                try:
+                    WebDriverWait(driver, 15).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, product_selector))
+                    )
+                    logging.info("Product listings detected")
+                except Exception as e:
+                    logging.warning(f"Could not detect product listings: {e}")
+
+                if scroll:
+                    # Infinite scroll: stop as soon as the product count is stable
+                    logging.info("Attempting infinite scroll")
+                    if not scroll_until_stable(driver, product_selector):
+                        logging.error("Redirected to Stash page during scrolling")
+                        pooled.recycle = True
+                        return None
+                else:
+                    logging.info("Page is paginated, skipping infinite scroll")
+
+                # Wait for any remaining AJAX requests to complete
+                wait_for_quiet(driver)
+                logging.info("Page is quiet")
+
+                # Scroll back to top
+                driver.execute_script("window.scrollTo(0, 0);")
+
+                # Get the page source
+                html = driver.page_source
+                logging.info(f"Successfully fetched {url}")
+                return html
 
         except Exception as e:
             logging.error(f"Failed to fetch {url}: {e}")
@@ -274,51 +677,473 @@ def fetch_page(url, max_retries=3, timeout=30):
             else:
                 logging.error(f"Max retries reached for {url}")
                 return None
-        finally:
-            # Always ensure WebDriver is closed properly
-            if driver:
-                try:
-                    driver.quit()
-                    logging.info("WebDriver closed successfully")
-                except Exception as e:
-                    logging.warning(f"Error quitting driver: {e}")
-            
-            # Clean up the temp directory
+
+_http_session = None
+_http_user_agents = None
+_http_lock = threading.Lock()
+
+def get_http_session():
+    """Return the process-wide requests.Session (keep-alive, gzip, retries)"""
+    global _http_session, _http_user_agents
+    with _http_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_SIZE,
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=Retry(total=2, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Encoding": "gzip, deflate",
+                "Accept-Language": "en-US,en;q=0.9",
+                "Connection": "keep-alive",
+            })
+            _http_user_agents = UserAgent()
+            _http_session = session
+        return _http_session
+
+def fetch_page_http(url, timeout=HTTP_TIMEOUT, limiter=None):
+    """Fetch a page with a plain GET; returns None on any failure"""
+    session = get_http_session()
+    if limiter is None:
+        limiter = HostLimiter()
+    try:
+        with limiter.slot(url):
+            logging.info(f"Fetching {url} over HTTP")
+            response = session.get(url, headers={"User-Agent": _http_user_agents.random}, timeout=timeout)
+        if "stash" in response.url.lower():
+            logging.error(f"HTTP fetch of {url} redirected to Stash page")
+            return None
+        response.raise_for_status()
+        logging.info(f"Fetched {url} over HTTP ({len(response.content)} bytes)")
+        return response.text
+    except requests.RequestException as e:
+        logging.warning(f"HTTP fetch failed for {url}: {e}")
+        return None
+
+def pick_parser_backend(preferred=HTML_PARSER):
+    """Return the fastest available BeautifulSoup backend, falling back to html.parser"""
+    candidates = ["lxml", "html.parser"] if preferred == "auto" else [preferred, "html.parser"]
+    for name in candidates:
+        if builder_registry.lookup(name):
+            return name
+        logging.warning(f"HTML parser backend {name} is not installed")
+    return "html.parser"
+
+PARSER_BACKEND = pick_parser_backend()
+
+def make_soup(html, parser_backend=None, parse_only=None):
+    """Build a BeautifulSoup tree; all backends share the same select() semantics"""
+    return BeautifulSoup(html, parser_backend or PARSER_BACKEND, parse_only=parse_only)
+
+def class_strainer(*class_names, name=None):
+    """
+    SoupStrainer for elements carrying any of class_names. While parsing, the class
+    attribute is still one raw string, so match whole tokens with a regex.
+    """
+    pattern = re.compile(r"(?:^|\s)(?:%s)(?:\s|$)" % "|".join(re.escape(c) for c in class_names))
+    return SoupStrainer(name, class_=pattern)
+
+class CaptureStore:
+    """
+    Compressed, content-addressed store of raw pages. A page is saved once, as
+    objects/<sha256[:2]>/<sha256>.html.zst (.html.gz without zstandard), however many
+    runs capture it; index.json lists each site's captures, oldest first.
+    """
+    INDEX = "index.json"
+
+    def __init__(self, root=CAPTURE_DIR):
+        self.root = root
+        self.index = {}  # site key -> [{"object", "name", "products", "captured_at"}]
+        self.dirty = False
+        # Objects are only pruned against an index that was read in full; an unreadable
+        # one would otherwise leave every stored page looking unreferenced
+        self.index_loaded = True
+        path = os.path.join(root, self.INDEX)
+        if os.path.exists(path):
             try:
-                if temp_dir and os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                    logging.info(f"Removed temp directory: {temp_dir}")
-            except Exception as e:
-                logging.warning(f"Failed to remove temp directory: {e}")
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error(f"Error loading capture index {path}: {e}")
+                self.index_loaded = False
+
+    def object_path(self, relpath):
+        return os.path.join(self.root, *relpath.split("/"))
+
+    def put(self, html):
+        """Store html unless an identical page is already stored; returns (object path, stored)"""
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        relpath = f"objects/{digest[:2]}/{digest}" + (".html.zst" if zstandard else ".html.gz")
+        path = self.object_path(relpath)
+        if os.path.exists(path):
+            return relpath, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if zstandard:
+            compressed = zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            compressed = gzip.compress(data, mtime=0)
+        with atomic_open(path, binary=True) as f:
+            f.write(compressed)
+        return relpath, True
+
+    def read(self, relpath):
+        with open(self.object_path(relpath), 'rb') as f:
+            data = f.read()
+        if relpath.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is needed to read {relpath}")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            data = gzip.decompress(data)
+        return data.decode('utf-8')
+
+    def add(self, site_key, name, html, products, captured_at=None):
+        """
+        Capture a site's page; returns True if it wasn't stored already. A page identical
+        to the site's latest capture keeps that entry (and its captured_at) rather than
+        adding another, so the history holds distinct pages and index.json stays put.
+        """
+        relpath, stored = self.put(html)
+        entries = self.index.setdefault(site_key, [])
+        if entries and entries[-1]["object"] == relpath:
+            if entries[-1]["products"] != products:
+                entries[-1]["products"] = products
+                self.dirty = True
+            return stored
+        if captured_at is None:
+            captured_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        entries.append({"object": relpath, "name": name, "products": products, "captured_at": captured_at})
+        del entries[:max(len(entries) - CAPTURE_HISTORY, 0)]
+        self.dirty = True
+        return stored
+
+    def latest(self, site_key):
+        """The most recent capture of a site, or None"""
+        entries = self.index.get(site_key)
+        return self.read(entries[-1]["object"]) if entries else None
+
+    def save(self):
+        """Write the index and delete the objects no capture refers to any more"""
+        if not self.dirty:
+            return
+        atomic_write_file(os.path.join(self.root, self.INDEX), json.dumps(self.index, indent=2))
+        self.dirty = False
+        if not self.index_loaded:
+            logging.warning(f"Not pruning {self.root}: its previous index couldn't be read")
+            return
+        referenced = {entry["object"] for entries in self.index.values() for entry in entries}
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "objects")):
+            for filename in filenames:
+                relpath = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if relpath not in referenced:
+                    os.remove(os.path.join(dirpath, filename))
+
+def save_captures(scrapers, results, skip_sites=(), mode=None):
+    """
+    Store the pages the scrapers captured, per mode (DEBUG_CAPTURE by default),
+    except those of skip_sites. Returns the number of pages newly written.
+    """
+    mode = mode or DEBUG_CAPTURE
+    store = CaptureStore() if mode != "off" else None
+    written = 0
+    for s in scrapers:
+        site_key = f"{s.name}_{s.part}"
+        capture, s.debug_capture = s.debug_capture, None
+        if store is None or capture is None or site_key in skip_sites:
+            continue
+        products = len(results.get(site_key, []))
+        if mode == "on-failure" and products:
+            continue
+        name, html = capture
+        try:
+            written += store.add(site_key, name, html, products)
+        except OSError as e:
+            logging.error(f"Error capturing page for {site_key}: {e}")
+    if store is not None:
+        try:
+            store.save()
+        except OSError as e:
+            logging.error(f"Error saving capture index in {store.root}: {e}")
+        logging.info(f"Debug captures ({mode}): {written} new pages stored in {store.root}")
+    return written
 
-def save_debug_file(filename, content):
-    """Safely save debug files with permission error handling."""
-    safe_write_file(filename, content)
+class ReplaySource:
+    """
+    Pages recorded by earlier runs, for --replay: the latest capture of each site
+    from a CaptureStore directory, or else the scraper's *_debug_*.html file in it.
+    """
+    def __init__(self, capture_dir):
+        self.capture_dir = capture_dir
+        self.store = CaptureStore(capture_dir)
 
-class Scraper:
-    def __init__(self, name, url, part):
+    def page(self, scraper):
+        site_key = f"{scraper.name}_{scraper.part}"
+        try:
+            html = self.store.latest(site_key)
+            if html is not None:
+                return html
+            path = os.path.join(self.capture_dir, scraper.capture_name)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read()
+        except (OSError, ValueError, RuntimeError) as e:
+            logging.error(f"Error reading capture for {site_key} from {self.capture_dir}: {e}")
+            return None
+        logging.warning(f"No capture of {site_key} in {self.capture_dir}")
+        return None
+
+def parse_price_cents(text):
+    """Parse a price like "54.99", "$1,099.00" or 45.5 into integer cents (None if invalid)"""
+    if text is None:
+        return None
+    try:
+        amount = Decimal(str(text).replace("$", "").replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    if not amount.is_finite():
+        return None
+    return int((amount * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+def format_cents(cents):
+    """Format integer cents as "54.99"; None stays None"""
+    if cents is None:
+        return None
+    return f"{cents // 100}.{cents % 100:02d}"
+
+def format_percent(percent):
+    return "N/A" if percent is None else f"{percent:.2f}%"
+
+class Product:
+    """
+    A scraped product. Prices are integer cents and the discount is computed once here.
+    Slotted, with interned store/part/availability strings, so full catalogs stay small.
+    """
+    FIELDS = ("name", "url", "price_new", "price_old", "availability", "part", "store")
+    __slots__ = FIELDS + ("percent_off", "_content_hash")
+
+    def __init__(self, name, url, price_new, price_old=None, availability="Check store", part=None, store=None):
         self.name = name
         self.url = url
+        self.price_new = price_new
+        self.price_old = price_old
+        self.availability = sys.intern(availability) if availability else availability
+        self.part = sys.intern(part) if part else part
+        self.store = sys.intern(store) if store else store
+        self._content_hash = None
+        if price_old and price_new is not None and price_old > 0:
+            self.percent_off = (price_old - price_new) * 100 / price_old
+        else:
+            self.percent_off = None
+
+    def discount_at_least(self, percent):
+        """Exact integer check of percent_off >= percent"""
+        if self.percent_off is None:
+            return False
+        return (self.price_old - self.price_new) * 100 >= percent * self.price_old
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Product({self.name!r}, {self.url!r}, {self.price_new}, {self.price_old}, part={self.part!r}, store={self.store!r})"
+
+    def content_hash(self):
+        """Stable digest of the fields compare() tracks; computed once per record"""
+        if self._content_hash is None:
+            key = f"{self.name}\x1f{self.price_new}\x1f{self.price_old}\x1f{self.availability}"
+            self._content_hash = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+        return self._content_hash
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["name"],
+            data["url"],
+            parse_price_cents(data.get("price_new")),
+            parse_price_cents(data.get("price_old")),
+            data.get("availability", "Check store"),
+            data.get("part"),
+            data.get("store"),
+        )
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "url": self.url,
+            "price_new": format_cents(self.price_new),
+            "price_old": format_cents(self.price_old),
+            "availability": self.availability,
+            "part": self.part,
+            "store": self.store,
+        }
+
+class ProductFilter:
+    """
+    One part's PRODUCT_FILTERS entry, compiled into a single brand regex plus numeric
+    limits. Raises ValueError for rules of the wrong type.
+    """
+    RULES = ("brands", "min_discount", "min_price", "max_price")
+
+    def __init__(self, part, brands=None, min_discount=None, min_price=None, max_price=None):
+        if isinstance(brands, str) or not all(isinstance(b, str) for b in brands or []):
+            raise ValueError(f"{part}: brands must be a list of names, not {brands!r}")
+        if min_discount is not None and (isinstance(min_discount, bool) or not isinstance(min_discount, (int, float))):
+            raise ValueError(f"{part}: min_discount must be a number, not {min_discount!r}")
         self.part = part
+        self.brands = list(brands or [])
+        self.brand_pattern = re.compile("|".join(re.escape(b) for b in self.brands)) if self.brands else None
+        self.min_discount = min_discount
+        self.min_cents = self.price_limit("min_price", min_price)
+        self.max_cents = self.price_limit("max_price", max_price)
+
+    def price_limit(self, rule, value):
+        if value is None:
+            return None
+        cents = parse_price_cents(value) if not isinstance(value, bool) else None
+        if cents is None:
+            raise ValueError(f"{self.part}: {rule} must be a price, not {value!r}")
+        return cents
+
+    def matches(self, product):
+        name = product.name
+        if self.brand_pattern and not self.brand_pattern.search(name):
+            logging.info(f"Skipping product not from {', '.join(self.brands)}: {name}")
+            return False
 
-    def scrape(self):
-        html = fetch_page(self.url)
+        if self.min_cents is not None and product.price_new < self.min_cents:
+            logging.info(f"Skipping product below ${format_cents(self.min_cents)}: {name} ({format_cents(product.price_new)})")
+            return False
+        if self.max_cents is not None and product.price_new > self.max_cents:
+            logging.info(f"Skipping product above ${format_cents(self.max_cents)}: {name} ({format_cents(product.price_new)})")
+            return False
+
+        if self.min_discount is not None:
+            percent_off = format_percent(product.percent_off)
+            logging.info(f"{self.part} {name}: {percent_off} off")
+            if product.percent_off is None:
+                logging.info(f"Skipping product with invalid % off: {name} ({percent_off})")
+                return False
+            if not product.discount_at_least(self.min_discount):
+                logging.info(f"Skipping product with less than {self.min_discount}% off: {name} ({percent_off})")
+                return False
+
+        return True
+
+def compile_filters(config):
+    """{part: ProductFilter} from a dict shaped like PRODUCT_FILTERS; raises ValueError if it isn't"""
+    if not isinstance(config, dict):
+        raise ValueError("expected an object mapping parts to rules")
+    filters = {}
+    for part, rules in config.items():
+        if not isinstance(rules, dict):
+            raise ValueError(f"{part}: expected an object of rules, not {rules!r}")
+        unknown = set(rules) - set(ProductFilter.RULES)
+        if unknown:
+            raise ValueError(f"{part}: unknown rules {', '.join(sorted(unknown))}")
+        filters[part] = ProductFilter(part, **rules)
+    return filters
+
+def load_filters(path=PRODUCT_FILTERS_FILE):
+    """Compile PRODUCT_FILTERS, or the JSON file at path if it exists and is valid, into {part: ProductFilter}"""
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                filters = compile_filters(json.load(f))
+            logging.info(f"Loaded product filters from {path}")
+            return filters
+        except Exception as e:
+            logging.error(f"Error loading product filters from {path}, using defaults: {e}")
+    return compile_filters(PRODUCT_FILTERS)
+
+FILTERS = load_filters()
+
+class Scraper:
+    # "browser" always loads the page in Chrome; "http" tries a plain GET first.
+    # CCSScraper also supports "shopify_json", which reads the products.json API.
+    fetch_strategy = "browser"
+    # Pattern the raw HTML must contain for an HTTP response to be used as-is
+    product_marker = None
+    # CSS selector for one product in the browser, and whether the listing lazy-loads
+    product_selector = PRODUCT_SELECTOR
+    lazy_load = True
+    # BeautifulSoup backend for parse(); None uses the process-wide PARSER_BACKEND
+    parser_backend = None
+    # SoupStrainer limiting the tree to product containers; None builds the whole page
+    product_strainer = None
+    # Captured pages are named "<capture_prefix>_debug_<part>.html"
+    capture_prefix = None
+    # ReplaySource to read pages from instead of fetching them (see main(replay_dir))
+    replay = None
+
+    def __init__(self, name, url, part):
+        self.name = sys.intern(name)
+        self.url = url
+        self.part = sys.intern(part)
+        # (filename, html) of the last parsed page; main() decides whether to save it
+        self.debug_capture = None
+
+    def has_products(self, html):
+        return bool(self.product_marker and self.product_marker.search(html))
+
+    @property
+    def capture_name(self):
+        return f"{self.capture_prefix}_debug_{self.part.lower()}.html"
+
+    def fetch(self, pool=None, limiter=None):
+        if self.replay is not None:
+            return self.replay.page(self)
+        # Every strategy other than "browser" tries a plain GET first
+        if self.fetch_strategy != "browser":
+            html = fetch_page_http(self.url, limiter=limiter)
+            if html and self.has_products(html):
+                return html
+            logging.info(f"No product markup in HTTP response for {self.url}, falling back to browser")
+        return fetch_page(self.url, pool=pool, limiter=limiter,
+                          scroll=self.lazy_load, product_selector=self.product_selector)
+
+    def scrape(self, pool=None, limiter=None):
+        html = self.fetch(pool, limiter)
         return self.parse(html)
 
+    def capture_page(self, html):
+        self.debug_capture = (self.capture_name, html)
+
+    def keep_product(self, product):
+        """Apply the PRODUCT_FILTERS rules for the product's part"""
+        product_filter = FILTERS.get(product.part)
+        return product_filter is None or product_filter.matches(product)
+
+    def build_soup(self, html, strainer=None):
+        strainer = strainer or self.product_strainer
+        return make_soup(html, self.parser_backend, strainer if PREFILTER_HTML else None)
+
     def parse(self, html):
         raise NotImplementedError
 
 class ZumiezScraper(Scraper):
+    capture_prefix = "zumiez"
+    product_selector = "li.ProductCard"
+    product_strainer = class_strainer("ProductCard", name="li")
+
     def parse(self, html):
         if not html:
             logging.error("No HTML to parse")
             return []
 
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self.build_soup(html)
         products = []
         seen = set()
 
-        save_debug_file(f"zumiez_debug_{self.part.lower()}.html", html)
+        self.capture_page(html)
         product_grid = soup.select("li.ProductCard")
         logging.info(f"Found {len(product_grid)} product containers")
 
@@ -342,42 +1167,20 @@ class ZumiezScraper(Scraper):
                     logging.warning(f"No name found for {href}")
                     continue
 
-                if self.part == "Wheels":
-                    if not any(brand in name for brand in ["Bones", "Powell", "Spitfire", "OJ"]):
-                        logging.info(f"Skipping product not from Bones, Powell, Spitfire, or OJ: {name}")
-                        continue
-
                 sale_price_el = product.select_one(".ProductPrice-PriceValue")
                 original_price_el = product.select_one(".ProductCardPrice-HighPrice")
-                sale_price = sale_price_el.get_text(strip=True).replace("$", "") if sale_price_el else None
-                original_price = original_price_el.get_text(strip=True).replace("$", "") if original_price_el else None
+                sale_price = parse_price_cents(sale_price_el.get_text(strip=True)) if sale_price_el else None
+                original_price = parse_price_cents(original_price_el.get_text(strip=True)) if original_price_el else None
 
-                if not sale_price:
+                if sale_price is None:
                     logging.warning(f"No sale price found for {href}")
                     continue
 
-                # Log discount percentage for decks
-                if self.part == "Decks":
-                    percent_off = calculate_percent_off(sale_price, original_price)
-                    logging.info(f"Deck {name}: {percent_off} off")
-                    try:
-                        percent_off_value = float(percent_off.strip("%"))
-                        if percent_off_value < 30:
-                            logging.info(f"Skipping deck with less than 30% off: {name} ({percent_off})")
-                            continue
-                    except (ValueError, TypeError):
-                        logging.info(f"Skipping deck with invalid % off: {name} ({percent_off})")
-                        continue
+                item = Product(name, href, sale_price, original_price, part=self.part, store=self.name)
+                if not self.keep_product(item):
+                    continue
 
-                availability = "Check store"
-                products.append({
-                    "name": name,
-                    "url": href,
-                    "price_new": sale_price,
-                    "price_old": original_price,
-                    "availability": availability,
-                    "part": self.part
-                })
+                products.append(item)
                 logging.info(f"Parsed product: {name}")
 
             except Exception as e:
@@ -388,100 +1191,100 @@ class ZumiezScraper(Scraper):
         return products
 
 class SkateWarehouseScraper(Scraper):
+    # Catpages are rendered server-side
+    fetch_strategy = "http"
+    capture_prefix = "skatewarehouse"
+    product_marker = re.compile(r"cattable-wrap-cell-info")
+    product_selector = "a.cattable-wrap-cell-info"
+    lazy_load = False
+
+    # Only anchors can be products on SkateWarehouse pages
+    product_strainer = SoupStrainer("a", href=True)
+
+    # One pass over each anchor: a product href mentions a part or brand, and the
+    # anchor text names the part ("Truck" also matches "Trucks")
+    HREF_KEYWORDS = re.compile(r"wheels|truck|bearings|deck|bones|spitfire|independent|bronson", re.IGNORECASE)
+    PART_KEYWORDS = re.compile(r"Wheels|Truck|Bearings|Deck")
+    KEYWORD_PARTS = {"Wheels": "Wheels", "Truck": "Trucks", "Bearings": "Bearings", "Deck": "Decks"}
+    PRICE = re.compile(r"\$(\d+\.\d{2})")
+
     def parse(self, html):
         if not html:
             logging.error("No HTML to parse")
             return []
 
-        soup = BeautifulSoup(html, "html.parser")
-        products = []
-        seen = set()
+        self.capture_page(html)
+        products = self.parse_parts(html, [self.part])[self.part]
+        logging.info(f"Parsed {len(products)} products")
+        return products
 
-        save_debug_file(f"skatewarehouse_debug_{self.part.lower()}.html", html)
+    def parse_parts(self, html, parts):
+        """Classify every anchor once and return {part: products} for each requested part"""
+        soup = self.build_soup(html)
+        products = {part: [] for part in parts}
+        seen = {part: set() for part in parts}
 
         for a in soup.find_all("a", href=True):
-            text = a.get_text(strip=True)
             href = a["href"]
 
             # Skip non-product links (relaxed filter)
-            if not any(part in href.lower() for part in ["wheels", "truck", "bearings", "deck"]) and not any(brand.lower() in href.lower() for brand in ["bones", "spitfire", "independent", "bronson"]):
+            if not self.HREF_KEYWORDS.search(href):
                 continue
 
             # Filter based on part type
-            if self.part == "Wheels" and "Wheels" not in text:
-                continue
-            if self.part == "Trucks" and "Truck" not in text:
-                continue
-            if self.part == "Bearings" and "Bearings" not in text:
-                continue
-            if self.part == "Decks" and "Deck" not in text:
-                continue
-
-            if href.startswith("/"):
-                href = "https://www.skatewarehouse.com" + href
-            if href in seen:
-                logging.info(f"Duplicate URL skipped: {href}")
+            text = a.get_text(strip=True)
+            matched_parts = {self.KEYWORD_PARTS[k] for k in self.PART_KEYWORDS.findall(text)}
+            matched_parts.intersection_update(products)
+            if not matched_parts:
                 continue
 
-            prices = re.findall(r"\$(\d+\.\d{2})", text)
+            prices = self.PRICE.findall(text)
             if not prices:
                 continue
 
+            if href.startswith("/"):
+                href = "https://www.skatewarehouse.com" + href
             name = text.split(f"${prices[0]}")[0].strip()
-            if not name:
-                logging.warning(f"No name found for {href}")
-                continue
+            price_new = parse_price_cents(prices[0])
+            price_old = parse_price_cents(prices[1]) if len(prices) > 1 else None
 
-            if self.part == "Wheels":
-                if not any(brand in name for brand in ["Bones", "Powell", "Spitfire", "OJ"]):
-                    logging.info(f"Skipping product not from Bones, Powell, Spitfire, or OJ: {name}")
+            for part in matched_parts:
+                if href in seen[part]:
+                    logging.info(f"Duplicate URL skipped: {href}")
                     continue
-            elif self.part == "Trucks":
-                if not any(brand in name for brand in ["Independent", "Indy", "Ace"]):
-                    logging.info(f"Skipping product not from Independent or Ace Trucks: {name}")
+                if not name:
+                    logging.warning(f"No name found for {href}")
                     continue
-            elif self.part == "Decks":
-                # Calculate % off and filter for 30%+ discount
-                price_new = prices[0]
-                price_old = prices[1] if len(prices) > 1 else None
-                percent_off = calculate_percent_off(price_new, price_old)
-                logging.info(f"Deck {name}: {percent_off} off")
-                try:
-                    percent_off_value = float(percent_off.strip("%"))
-                    if percent_off_value < 30:
-                        logging.info(f"Skipping deck with less than 30% off: {name} ({percent_off})")
-                        continue
-                except (ValueError, TypeError):
-                    logging.info(f"Skipping deck with invalid % off: {name} ({percent_off})")
+                item = Product(name, href, price_new, price_old, part=part, store=self.name)
+                if not self.keep_product(item):
                     continue
 
-            seen.add(href)
-            price_old = prices[1] if len(prices) > 1 else None
-            products.append({
-                "name": name,
-                "url": href,
-                "price_new": prices[0],
-                "price_old": price_old,
-                "availability": "Check store",
-                "part": self.part
-            })
-            logging.info(f"Parsed product: {name}")
+                seen[part].add(href)
+                products[part].append(item)
+                logging.info(f"Parsed product: {name}")
 
-        logging.info(f"Parsed {len(products)} products")
         return products
 
 # CCS Scraper Fix
 class CCSScraper(Scraper):
+    # Shopify exposes the collection as JSON; the HTML is rendered server-side too
+    fetch_strategy = "shopify_json"
+    capture_prefix = "ccs"
+    product_marker = re.compile(r'class="(?:[^"]*\s)?(?:product-card|product-item|product)(?:\s[^"]*)?"')
+    product_selector = ".product-card, .product-item, .product"
+    product_strainer = class_strainer("product-card", "product-item", "product")
+    lazy_load = False
+
     def parse(self, html):
         if not html:
             logging.error("No HTML to parse")
             return []
 
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self.build_soup(html)
         products = []
         seen = set()
 
-        save_debug_file(f"ccs_debug_{self.part.lower()}.html", html)
+        self.capture_page(html)
 
         # Updated selectors for CCS website
         # The site appears to use a product-card structure based on search results
@@ -517,7 +1320,7 @@ class CCSScraper(Scraper):
                     logging.warning(f"No prices found for {href}")
                     continue
                 
-                price_new = prices[0]
+                price_new = parse_price_cents(prices[0])
                 
                 # Try to get original price from compare price element
                 price_old = None
@@ -525,34 +1328,13 @@ class CCSScraper(Scraper):
                     compare_text = compare_price_el.get_text(strip=True)
                     compare_prices = re.findall(r"\$(\d+\.\d{2})", compare_text)
                     if compare_prices:
-                        price_old = compare_prices[0]
+                        price_old = parse_price_cents(compare_prices[0])
 
-                # For decks, filter for 30%+ discount
-                if self.part == "Decks":
-                    percent_off = calculate_percent_off(price_new, price_old)
-                    logging.info(f"Deck {name}: {percent_off} off")
-                    try:
-                        percent_off_value = float(percent_off.strip("%"))
-                        if percent_off_value < 30:
-                            logging.info(f"Skipping deck with less than 30% off: {name} ({percent_off})")
-                            continue
-                    except (ValueError, TypeError):
-                        logging.info(f"Skipping deck with invalid % off: {name} ({percent_off})")
-                        continue
-
-                if self.part == "Wheels":
-                    if not any(brand in name for brand in ["Bones", "Powell", "Spitfire", "OJ"]):
-                        logging.info(f"Skipping product not from Bones, Powell, Spitfire, or OJ: {name}")
-                        continue
+                item = Product(name, href, price_new, price_old, part=self.part, store=self.name)
+                if not self.keep_product(item):
+                    continue
 
-                products.append({
-                    "name": name,
-                    "url": href,
-                    "price_new": price_new,
-                    "price_old": price_old,
-                    "availability": "Check store",
-                    "part": self.part
-                })
+                products.append(item)
                 logging.info(f"Parsed product: {name}")
 
             except Exception as e:
@@ -562,12 +1344,117 @@ class CCSScraper(Scraper):
         logging.info(f"Parsed {len(products)} products")
         return products
 
+    def collection_path(self):
+        """The listing's "/collections/<handle>" path, which its product links are nested under"""
+        segments = urlsplit(self.url).path.strip("/").split("/")
+        if len(segments) >= 2 and segments[0] == "collections":
+            return f"/collections/{segments[1]}"
+        return ""
+
+    def products_json_url(self, page):
+        parts = urlsplit(self.url)
+        return f"{parts.scheme}://{parts.netloc}{parts.path.rstrip('/')}/products.json?page={page}&limit={SHOPIFY_PAGE_LIMIT}"
+
+    def matches_part(self, product_type):
+        """Whether a Shopify product_type such as "Skateboard Wheels" is this scraper's part"""
+        return bool(product_type) and self.part.lower().rstrip("s") in product_type.lower()
+
+    def fetch_products_json(self, limiter=None):
+        """
+        Page through the Shopify products.json endpoint for this collection and build
+        the same Product records as parse(). Returns None if the endpoint can't be used.
+        """
+        session = get_http_session()
+        if limiter is None:
+            limiter = HostLimiter()
+        parts = urlsplit(self.url)
+        # Same links as the listing's HTML, so compare() keys items alike on both paths
+        product_base = f"{parts.scheme}://{parts.netloc}{self.collection_path()}/products/"
+
+        products = []
+        seen = set()
+        for page in range(1, SHOPIFY_MAX_PAGES + 1):
+            url = self.products_json_url(page)
+            try:
+                with limiter.slot(url):
+                    logging.info(f"Fetching {url}")
+                    response = session.get(url, headers={"Accept": "application/json"}, timeout=HTTP_TIMEOUT)
+                response.raise_for_status()
+                page_products = response.json().get("products", [])
+            except (requests.RequestException, ValueError, AttributeError) as e:
+                logging.warning(f"Shopify JSON fetch failed for {url}: {e}")
+                return None
+            if page == 1 and not page_products:
+                # Tag-filtered listings aren't always backed by products.json; let the HTML decide
+                logging.warning(f"Shopify JSON returned no products for {url}")
+                return None
+
+            for prod in page_products:
+                try:
+                    name = (prod.get("title") or "").strip()
+                    handle = prod.get("handle")
+                    variants = prod.get("variants") or []
+                    if not (name and handle and variants):
+                        logging.warning("Missing title, handle, or variants for product")
+                        continue
+                    # The JSON covers the whole collection, not just the listing's part
+                    if not self.matches_part(prod.get("product_type")):
+                        logging.info(f"Skipping {prod.get('product_type') or 'untyped'} product for {self.part}: {name}")
+                        continue
+
+                    href = product_base + handle
+                    if href in seen:
+                        logging.info(f"Duplicate URL skipped: {href}")
+                        continue
+                    seen.add(href)
+
+                    # Use the cheapest variant that is in stock, or the cheapest overall
+                    in_stock = [v for v in variants if v.get("available", True)]
+                    variant = min(in_stock or variants, key=lambda v: parse_price_cents(v.get("price")) or 0)
+                    price_new = parse_price_cents(variant.get("price"))
+                    if not price_new:
+                        logging.warning(f"No prices found for {href}")
+                        continue
+                    price_old = parse_price_cents(variant.get("compare_at_price"))
+                    if price_old is not None and price_old <= price_new:
+                        price_old = None
+
+                    item = Product(name, href, price_new, price_old, part=self.part, store=self.name)
+                    if not self.keep_product(item):
+                        continue
+
+                    products.append(item)
+                    logging.info(f"Parsed product: {name}")
+
+                except Exception as e:
+                    logging.error(f"Error parsing product: {e}")
+                    continue
+
+            if len(page_products) < SHOPIFY_PAGE_LIMIT:
+                break
+
+        logging.info(f"Parsed {len(products)} products from Shopify JSON")
+        return products
+
+    def scrape(self, pool=None, limiter=None):
+        if self.fetch_strategy == "shopify_json" and self.replay is None:
+            products = self.fetch_products_json(limiter)
+            if products is not None:
+                return products
+            logging.info(f"Shopify JSON unavailable for {self.url}, falling back to HTML")
+        return super().scrape(pool, limiter)
+
 class ZumiezDecksScraper(ZumiezScraper):
     def __init__(self):
         super().__init__("Zumiez", "https://www.zumiez.com/skate/skateboard-decks.html?customFilters=promotion_flag:Sale", "Decks")
 
 # Tactics Decks Scraper Fix
 class TacticsDecksScraper(Scraper):
+    capture_prefix = "tactics"
+    product_selector = ".product-card, .product-item, article.product, .product, [itemtype*='Product']"
+    product_strainer = class_strainer("product-card", "product-item", "product")
+    fallback_strainer = SoupStrainer(attrs={"itemtype": re.compile("Product")})
+
     def __init__(self):
         super().__init__("Tactics", "https://www.tactics.com/skateboard-decks/sale", "Decks")
 
@@ -576,11 +1463,11 @@ class TacticsDecksScraper(Scraper):
             logging.error("No HTML to parse")
             return []
 
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self.build_soup(html)
         products = []
         seen = set()
 
-        save_debug_file(f"tactics_debug_decks.html", html)
+        self.capture_page(html)
 
         # Updated selectors for current Tactics website
         product_containers = soup.select(".product-card, .product-item, article.product, .product")
@@ -588,6 +1475,8 @@ class TacticsDecksScraper(Scraper):
 
         if len(product_containers) == 0:
             # Try alternative selectors if the main ones don't work
+            if PREFILTER_HTML:
+                soup = self.build_soup(html, self.fallback_strainer)
             product_containers = soup.select("[itemtype*='Product']")
             logging.info(f"Using fallback selector, found {len(product_containers)} product containers")
 
@@ -653,26 +1542,11 @@ class TacticsDecksScraper(Scraper):
                     logging.warning(f"No prices found for {href}")
                     continue
 
-                # Calculate % off and filter for 30%+ discount
-                percent_off = calculate_percent_off(price_new, price_old)
-                logging.info(f"Deck {name}: {percent_off} off")
-                try:
-                    percent_off_value = float(percent_off.strip("%"))
-                    if percent_off_value < 30:
-                        logging.info(f"Skipping deck with less than 30% off: {name} ({percent_off})")
-                        continue
-                except (ValueError, TypeError):
-                    logging.info(f"Skipping deck with invalid % off: {name} ({percent_off})")
+                item = Product(name, href, parse_price_cents(price_new), parse_price_cents(price_old), part=self.part, store=self.name)
+                if not self.keep_product(item):
                     continue
 
-                products.append({
-                    "name": name,
-                    "url": href,
-                    "price_new": price_new,
-                    "price_old": price_old,
-                    "availability": "Check store",
-                    "part": self.part
-                })
+                products.append(item)
                 logging.info(f"Parsed product: {name}")
 
             except Exception as e:
@@ -682,465 +1556,1084 @@ class TacticsDecksScraper(Scraper):
         logging.info(f"Parsed {len(products)} products")
         return products
 
-def load_previous(path="previous_data.json"):
-    """Load previous data with permission error handling."""
-    try:
-        if os.path.exists(path):
-            with open(path, 'r') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        logging.error(f"Error loading previous data: {e}")
-        return {}
+class PriceHistory:
+    """
+    Append-only SQLite store of product observations, indexed by URL and time, so
+    price trajectories can be queried without loading old snapshots. main() records
+    a site only when its items changed, so each trajectory holds the points where it stepped.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS observations (
+            url TEXT NOT NULL,
+            store TEXT NOT NULL,
+            part TEXT NOT NULL,
+            name TEXT,
+            price_cents INTEGER,
+            price_old_cents INTEGER,
+            availability TEXT,
+            observed_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_observations_url_time ON observations (url, observed_at);
+        CREATE INDEX IF NOT EXISTS idx_observations_time ON observations (observed_at);
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
-def save_current(data, path="previous_data.json"):
-    """Save current data with permission error handling."""
+    def record(self, data, observed_at=None):
+        """Append one observation per product in {site_key: [Product]}"""
+        if observed_at is None:
+            observed_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        rows = [
+            (p.url, p.store, p.part, p.name, p.price_new, p.price_old, p.availability, observed_at)
+            for items in data.values() for p in items
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO observations (url, store, part, name, price_cents, price_old_cents, availability, observed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        logging.info(f"Recorded {len(rows)} observations in {self.path}")
+        return len(rows)
+
+    def trajectory(self, url, since=None, until=None):
+        """Return [(observed_at, price_cents, price_old_cents)] for one product, oldest first"""
+        query = "SELECT observed_at, price_cents, price_old_cents FROM observations WHERE url = ?"
+        params = [url]
+        if since:
+            query += " AND observed_at >= ?"
+            params.append(since)
+        if until:
+            query += " AND observed_at <= ?"
+            params.append(until)
+        return self.conn.execute(query + " ORDER BY observed_at", params).fetchall()
+
+    def first_seen(self, url):
+        row = self.conn.execute("SELECT MIN(observed_at) FROM observations WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.conn.close()
+
+class SnapshotWriter:
+    """
+    Stream a snapshot to disk as sites finish: one JSON record per line, each tagged
+    with its site key, then a trailer line with the record count and a SHA-256 of
+    everything above it. Records go to a .partial file; commit() fsyncs it, keeps the
+    snapshot it replaces as .bak if that one verifies, and renames it into place.
+    """
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self.partial_path = path + ".partial"
+        self.backup_path = path + ".bak"
+        self.sites_written = 0
+        self.site_keys = set()
+        self.records = 0
+        self._checksum = hashlib.sha256()
+        self._file = open(self.partial_path, 'wb')
+
+    def write_site(self, site_key, items):
+        for item in items:
+            record = {"site": site_key}
+            record.update(item.to_dict())
+            line = (json.dumps(record) + "\n").encode('utf-8')
+            self._checksum.update(line)
+            self._file.write(line)
+            self.records += 1
+        self._file.flush()
+        self.sites_written += 1
+        self.site_keys.add(site_key)
+
+    def fill_from(self, previous):
+        """Write the sites of a previous snapshot that this one doesn't have yet"""
+        for site_key, items in previous.items():
+            if site_key not in self.site_keys:
+                self.write_site(site_key, items)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def commit(self, fingerprints=None):
+        """Finish the snapshot; fingerprints (see run_fingerprint) are kept in its trailer"""
+        trailer = {"checksum": self._checksum.hexdigest(), "records": self.records}
+        if fingerprints is not None:
+            trailer["fingerprints"] = fingerprints
+        self._file.write((json.dumps(trailer) + "\n").encode('utf-8'))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        # Only a snapshot that verifies may replace the last good one
+        if os.path.exists(self.path):
+            try:
+                SnapshotReader(self.path)
+                os.replace(self.path, self.backup_path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Not keeping {self.path} as a backup: {e}")
+        os.replace(self.partial_path, self.path)
+        fsync_directory(self.path)
+        logging.info(f"Saved snapshot of {self.sites_written} sites ({self.records} items) to {self.path}")
+
+    def close(self):
+        """Close without committing; the .partial file keeps whatever was written"""
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        """Close without committing and delete the .partial file"""
+        self.close()
+        with contextlib.suppress(OSError):
+            os.remove(self.partial_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SnapshotReader:
+    """
+    Lazy view of a JSON-lines snapshot. Opening it checks the trailer's checksum and
+    indexes where each site's records start (raising ValueError if the file is
+    truncated or corrupt); items are parsed one site at a time when asked for.
+    """
+    SITE_PREFIX = re.compile(rb'^\{"site": ("(?:[^"\\]|\\.)*")')
+    TRAILER_PREFIX = b'{"checksum": '
+
+    def __init__(self, path):
+        self.path = path
+        self._blocks = {}  # site key -> [(byte offset, record count)]
+        self.fingerprints = {}  # site key -> site_fingerprint, when the writer recorded them
+        checksum = hashlib.sha256()
+        records = 0
+        trailer = None
+        with open(path, 'rb') as f:
+            offset = 0
+            site = None
+            for line in f:
+                if trailer is not None:
+                    raise ValueError(f"data after the checksum trailer at byte {offset}")
+                if line.startswith(self.TRAILER_PREFIX):
+                    trailer = json.loads(line)
+                    continue
+                match = self.SITE_PREFIX.match(line)
+                if not match or not line.endswith(b"\n"):
+                    raise ValueError(f"malformed record at byte {offset}")
+                checksum.update(line)
+                records += 1
+                line_site = json.loads(match.group(1))
+                if line_site == site:
+                    start, count = self._blocks[site][-1]
+                    self._blocks[site][-1] = (start, count + 1)
+                else:
+                    site = line_site
+                    self._blocks.setdefault(site, []).append((offset, 1))
+                offset += len(line)
+
+        if trailer is None:
+            raise ValueError("missing checksum trailer (truncated write?)")
+        if trailer.get("records") != records or trailer.get("checksum") != checksum.hexdigest():
+            raise ValueError(f"checksum mismatch ({records} records, trailer says {trailer.get('records')})")
+        self.fingerprints = trailer.get("fingerprints") or {}
+
+    def sites(self):
+        return list(self._blocks)
+
+    def __contains__(self, site):
+        return site in self._blocks
+
+    def iter_site(self, site):
+        """Yield the Products recorded for a site, reading only that site's lines"""
+        with open(self.path, 'rb') as f:
+            for start, count in self._blocks.get(site, []):
+                f.seek(start)
+                for _ in range(count):
+                    record = json.loads(f.readline())
+                    record.pop("site", None)
+                    yield Product.from_dict(record)
+
+    def get(self, site, default=None):
+        if site not in self._blocks:
+            return default
+        return list(self.iter_site(site))
+
+    def items(self):
+        """Yield (site key, [Product]) one site at a time"""
+        for site in self._blocks:
+            yield site, self.get(site)
+
+def read_snapshot(path):
+    """Open a snapshot in either format; raises if it is empty, truncated or corrupt"""
+    with open(path, 'rb') as f:
+        head = f.read(len(b'{"site": '))
+    if not head:
+        raise ValueError("empty file")
+    if head == b'{"site": ' or head.startswith(SnapshotReader.TRAILER_PREFIX[:len(head)]):
+        return SnapshotReader(path)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {site: [Product.from_dict(item) for item in items] for site, items in data.items()}
+
+def load_previous(path=SNAPSHOT_FILE):
+    """
+    Open the previous snapshot lazily. If it fails verification, fall back to the last
+    good one (.bak), then to the older single-document JSON snapshot, so a crashed
+    write doesn't make every item look new.
+    """
+    candidates = [path, path + ".bak"]
+    if path == SNAPSHOT_FILE:
+        candidates.append(LEGACY_SNAPSHOT_FILE)
+    for candidate in candidates:
+        if not os.path.exists(candidate):
+            continue
+        try:
+            snapshot = read_snapshot(candidate)
+        except Exception as e:
+            logging.error(f"Error loading previous data from {candidate}: {e}")
+            continue
+        if candidate != path:
+            logging.warning(f"Recovered previous data from {candidate}")
+        return snapshot
+    return {}
+
+def save_current(data, path=SNAPSHOT_FILE):
+    """Save a complete snapshot in one go (main() streams it with SnapshotWriter instead)"""
     try:
-        return safe_write_file(path, json.dumps(data, indent=2))
+        with SnapshotWriter(path) as writer:
+            for site, items in data.items():
+                writer.write_site(site, items)
+            writer.commit(run_fingerprint(data))
+        return True
     except Exception as e:
         logging.error(f"Error saving current data: {e}")
         return False
 
-def compare(prev, curr):
+# Change types compare() emits for a product present in both runs, and the field behind each
+FIELD_CHANGES = [
+    ("price_change", "price_new"),
+    ("original_price_change", "price_old"),
+    ("name_change", "name"),
+    ("availability_change", "availability"),
+]
+PRICE_CHANGE_TYPES = {"price_change", "original_price_change"}
+
+def site_fingerprint(items):
+    """Order-independent digest of a site's items, covering everything compare() looks at"""
+    digest = hashlib.blake2b(digest_size=8)
+    for key in sorted(f"{item.url}\x1f{item.content_hash()}" for item in items):
+        digest.update(key.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def run_fingerprint(data):
+    """{site key: site_fingerprint} for a run's {site_key: [Product]} data"""
+    return {site: site_fingerprint(items) for site, items in data.items()}
+
+def compare(prev, curr, unchanged=()):
+    """
+    Diff two {site_key: [Product]} snapshots by URL. Sites in unchanged (matching
+    fingerprints) are skipped outright; within a site, items whose content hash is
+    unchanged are skipped and only changed items are compared field by field.
+    """
     changes = {}
     for site, items in curr.items():
-        prev_map = {i["url"]: i for i in prev.get(site, [])}
+        if site in unchanged:
+            continue
+        prev_map = {i.url: i for i in prev.get(site, [])}
         diffs = []
         for it in items:
-            pi = prev_map.get(it["url"])
-            if not pi:
+            pi = prev_map.pop(it.url, None)
+            if pi is None:
                 diffs.append({"type": "new", "item": it})
-            elif it["price_new"] != pi.get("price_new"):
-                diffs.append({
-                    "type": "price_change",
-                    "url": it["url"],
-                    "old": pi.get("price_new"),
-                    "new": it["price_new"],
-                    "name": it["name"]
-                })
-        curr_urls = {i["url"] for i in items}
-        for url, pi in prev_map.items():
-            if url not in curr_urls:
-                diffs.append({"type": "removed", "item": pi})
+            elif it.content_hash() != pi.content_hash():
+                for change_type, field in FIELD_CHANGES:
+                    old, new = getattr(pi, field), getattr(it, field)
+                    if old != new:
+                        diffs.append({
+                            "type": change_type,
+                            "url": it.url,
+                            "old": old,
+                            "new": new,
+                            "name": it.name
+                        })
+        # Whatever wasn't matched by a current item has been removed
+        for pi in prev_map.values():
+            diffs.append({"type": "removed", "item": pi})
         if diffs:
             changes[site] = diffs
     return changes
 
-def calculate_percent_off(price_new, price_old):
+def format_change_value(change_type, value):
+    if change_type in PRICE_CHANGE_TYPES:
+        return format_cents(value) or "N/A"
+    return value
+
+def write_change_journal(changes, path=CHANGE_JOURNAL, observed_at=None):
+    """Append one JSON line per change to the per-site change journal"""
+    if not changes:
+        return 0
+    if observed_at is None:
+        observed_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    count = 0
     try:
-        new = float(price_new)
-        old = float(price_old)
-        if old <= 0:
-            return "N/A"
-        percent_off = ((old - new) / old) * 100
-        return f"{percent_off:.2f}%"
-    except (ValueError, TypeError):
-        return "N/A"
-
-def generate_html_chart(data, changes, output_file="sale_items_chart.html"):
+        with open(path, 'a', encoding='utf-8') as f:
+            for site, site_changes in changes.items():
+                for c in site_changes:
+                    entry = {"observed_at": observed_at, "site": site, "type": c["type"]}
+                    if "item" in c:
+                        entry.update(c["item"].to_dict())
+                    else:
+                        entry.update({
+                            "url": c["url"],
+                            "name": c["name"],
+                            "old": format_change_value(c["type"], c["old"]),
+                            "new": format_change_value(c["type"], c["new"]),
+                        })
+                    f.write(json.dumps(entry) + "\n")
+                    count += 1
+        logging.info(f"Appended {count} changes to {path}")
+    except (IOError, PermissionError) as e:
+        logging.error(f"Error writing change journal {path}: {e}")
+    return count
+
+# Static parts of the HTML report, built once at import; a run only renders rows
+REPORT_META = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Sale Items and Changes</title>
+<link href="https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700&display=swap" rel="stylesheet">
+"""
+REPORT_STYLE = """    body {
+        font-family: 'Roboto', sans-serif;
+        margin: 20px;
+        background-color: #f5f7fa;
+        color: #333;
+    }
+    h1, h2, h3 {
+        text-align: center;
+        color: #2c3e50;
+    }
+    h1 {
+        font-size: 2.2em;
+        margin-bottom: 20px;
+    }
+    h2 {
+        font-size: 1.8em;
+        margin-top: 40px;
+    }
+    h3 {
+        font-size: 1.4em;
+        margin: 20px 0;
+        cursor: pointer;
+        display: flex;
+        align-items: center;
+        gap: 8px;
+    }
+    h3::before {
+        content: '▼';
+        font-size: 0.8em;
+        transition: transform 0.3s;
+    }
+    h3.collapsed::before {
+        content: '▶';
+        transform: rotate(0deg);
+    }
+    .summary {
+        background-color: #ffffff;
+        padding: 15px;
+        border-radius: 8px;
+        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
+        margin-bottom: 20px;
+        text-align: center;
+    }
+    .search-container {
+        margin: 20px 0;
+        text-align: center;
+    }
+    .search-container input {
+        padding: 10px;
+        width: 300px;
+        border: 1px solid #ddd;
+        border-radius: 5px;
+        font-size: 1em;
+    }
+    table {
+        width: 100%;
+        border-collapse: collapse;
+        margin: 20px 0;
+        background-color: #ffffff;
+        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
+        border-radius: 8px;
+        overflow: hidden;
+    }
+    th, td {
+        padding: 12px;
+        text-align: left;
+        border-bottom: 1px solid #e0e0e0;
+    }
+    th {
+        background: linear-gradient(135deg, #3498db, #2980b9);
+        color: white;
+        position: sticky;
+        top: 0;
+        z-index: 1;
+        cursor: pointer;
+        font-weight: 500;
+    }
+    th:hover {
+        background: linear-gradient(135deg, #2980b9, #1c5f8a);
+    }
+    th::after {
+        content: '';
+        margin-left: 5px;
+        font-size: 0.8em;
+    }
+    th.asc::after {
+        content: '↑';
+    }
+    th.desc::after {
+        content: '↓';
+    }
+    tr.alt {
+        background-color: #f9f9f9;
+    }
+    tr:hover {
+        background-color: #f1f1f1;
+    }
+    a {
+        color: #3498db;
+        text-decoration: none;
+    }
+    a:hover {
+        text-decoration: underline;
+    }
+    .new {
+        background-color: #e6f7e6;
+    }
+    .price-change {
+        background-color: #fff4e1;
+    }
+    .removed {
+        background-color: #ffe6e6;
+    }
+    .section {
+        margin-bottom: 40px;
+    }
+    .table-viewport {
+        max-height: 70vh;
+        overflow-y: auto;
+        margin: 20px 0;
+    }
+    .table-viewport table {
+        margin: 0;
+    }
+    .table-viewport td {
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+        max-width: 28em;
+    }
+    tr.spacer td {
+        padding: 0;
+        border: 0;
+    }
+    .collapsible-content {
+        display: block;
+        transition: max-height 0.3s ease-out;
+        overflow: hidden;
+    }
+    .collapsible-content.collapsed {
+        display: none;
+    }
+    @media (max-width: 768px) {
+        table {
+            display: block;
+            overflow-x: auto;
+        }
+        th, td {
+            min-width: 120px;
+        }
+    }
+"""
+REPORT_SCRIPT = """    // Tables are rendered from JSON rows, embedded after each table or fetched from
+    // per-site shard files when the section opens. Only the rows in view
+    // (plus ROW_BUFFER either side) exist in the DOM; spacer rows stand in for the rest.
+    const ROW_BUFFER = 10;
+    const DEFAULT_ROW_HEIGHT = 45;
+    const SEARCH_DEBOUNCE_MS = 150;
+    const collator = new Intl.Collator();
+    const tables = {};
+    const shards = {};
+    let searchQuery = '';
+    let searchTimer = null;
+
+    function initTable(table, rows) {
+        const columns = table.tHead.rows[0].cells.length;
+        const state = {
+            table: table,
+            tbody: table.tBodies[0],
+            viewport: table.parentElement,
+            rows: rows,
+            columns: columns,
+            link: table.dataset.link === undefined ? -1 : Number(table.dataset.link),
+            rowClass: table.dataset.rowClass || '',
+            // Lowercase text of each row, built once so a keystroke is one includes() per row
+            search: rows.map(row => row.slice(0, columns).join(' ').toLowerCase()),
+            keys: {},
+            order: rows.map((row, i) => i),
+            rowHeight: 0,
+            pending: false,
+        };
+        applySearch(state);
+        state.viewport.addEventListener('scroll', () => scheduleRender(state), {passive: true});
+        tables[table.id] = state;
+        revealMatches(state);
+        renderRows(state);
+    }
+
+    function fetchShard(url) {
+        if (!shards[url]) {
+            shards[url] = fetch(url).then(response => {
+                if (!response.ok) throw new Error(url + ': ' + response.status);
+                return response.json();
+            });
+        }
+        return shards[url];
+    }
+
+    function loadTables(content) {
+        // Sharded reports: fetch a table's per-site rows the first time its section opens
+        for (const table of content.querySelectorAll('table[data-shards]')) {
+            if (tables[table.id] || table.dataset.loading) continue;
+            table.dataset.loading = 'true';
+            const key = table.dataset.shardKey;
+            Promise.all(table.dataset.shards.split(' ').map(fetchShard))
+                .then(parts => initTable(table, [].concat(...parts.map(shard => shard[key] || []))))
+                .catch(error => {
+                    delete table.dataset.loading;
+                    console.error('Could not load rows for ' + table.id, error);
+                });
+        }
+    }
+
+    function spacerRow(height, columns) {
+        const tr = document.createElement('tr');
+        const td = document.createElement('td');
+        tr.className = 'spacer';
+        td.colSpan = columns;
+        td.style.height = height + 'px';
+        tr.appendChild(td);
+        return tr;
+    }
+
+    function buildRow(state, row, position) {
+        const tr = document.createElement('tr');
+        if (state.rowClass) tr.className = state.rowClass;
+        if (position % 2) tr.classList.add('alt');
+        for (let c = 0; c < state.columns; c++) {
+            const td = document.createElement('td');
+            if (c === state.link) {
+                const a = document.createElement('a');
+                a.href = row[state.columns];
+                a.target = '_blank';
+                a.textContent = row[c];
+                td.appendChild(a);
+            } else {
+                td.textContent = row[c];
+            }
+            tr.appendChild(td);
+        }
+        return tr;
+    }
+
+    function renderRows(state) {
+        state.pending = false;
+        const viewport = state.viewport;
+        if (!viewport.offsetParent) return;  // inside a collapsed section
+        const rowHeight = state.rowHeight || DEFAULT_ROW_HEIGHT;
+        const first = Math.max(0, Math.floor(viewport.scrollTop / rowHeight) - ROW_BUFFER);
+        const last = Math.min(state.view.length, first + Math.ceil(viewport.clientHeight / rowHeight) + 2 * ROW_BUFFER);
+        const fragment = document.createDocumentFragment();
+        fragment.appendChild(spacerRow(first * rowHeight, state.columns));
+        for (let i = first; i < last; i++) {
+            fragment.appendChild(buildRow(state, state.rows[state.view[i]], i));
+        }
+        fragment.appendChild(spacerRow((state.view.length - last) * rowHeight, state.columns));
+        state.tbody.replaceChildren(fragment);
+
+        if (!state.rowHeight && last > first) {
+            state.rowHeight = state.tbody.rows[1].offsetHeight || DEFAULT_ROW_HEIGHT;
+            if (state.rowHeight !== rowHeight) renderRows(state);
+        }
+    }
+
+    function scheduleRender(state) {
+        if (state.pending) return;
+        state.pending = true;
+        requestAnimationFrame(() => renderRows(state));
+    }
+
+    function applySearch(state) {
+        state.view = searchQuery ? state.order.filter(i => state.search[i].includes(searchQuery)) : state.order;
+    }
+
+    function sortKeys(state, colIndex, isNumeric) {
+        // Parsed once per column, so comparisons never touch the DOM or re-parse text
+        if (!state.keys[colIndex]) {
+            state.keys[colIndex] = isNumeric
+                ? Float64Array.from(state.rows, row => parseFloat(String(row[colIndex]).replace(/[$%,]/g, '')) || 0)
+                : state.rows.map(row => row[colIndex]);
+        }
+        return state.keys[colIndex];
+    }
+
+    function sortTable(tableId, colIndex, isNumeric = false) {
+        const state = tables[tableId];
+        if (!state) return;  // rows not loaded yet
+        const header = state.table.tHead.rows[0];
+        const isAsc = header.cells[colIndex].getAttribute('data-sort') !== 'asc';
+        const direction = isAsc ? 1 : -1;
+        const keys = sortKeys(state, colIndex, isNumeric);
+
+        state.order = state.order.slice().sort(isNumeric
+            ? (a, b) => direction * (keys[a] - keys[b])
+            : (a, b) => direction * collator.compare(keys[a], keys[b]));
+
+        header.cells[colIndex].setAttribute('data-sort', isAsc ? 'asc' : 'desc');
+        for (let i = 0; i < header.cells.length; i++) {
+            header.cells[i].classList.remove('asc', 'desc');
+        }
+        header.cells[colIndex].classList.add(isAsc ? 'asc' : 'desc');
+
+        applySearch(state);
+        renderRows(state);
+    }
+
+    function revealMatches(state) {
+        // Open a collapsed section the search found rows in, so the matches can be seen
+        if (!searchQuery || !state.view.length) return;
+        const content = state.table.closest('.collapsible-content');
+        if (!content || !content.classList.contains('collapsed')) return;
+        content.classList.remove('collapsed');
+        content.previousElementSibling.classList.remove('collapsed');
+        for (const table of content.getElementsByTagName('table')) {
+            if (tables[table.id]) renderRows(tables[table.id]);
+        }
+    }
+
+    function searchTable() {
+        searchQuery = document.getElementById('searchInput').value.toLowerCase();
+        // Sharded sections load their rows when opened; a search has to cover them all
+        if (searchQuery) document.querySelectorAll('.collapsible-content').forEach(loadTables);
+        for (const state of Object.values(tables)) {
+            applySearch(state);
+            state.viewport.scrollTop = 0;
+            revealMatches(state);
+            renderRows(state);
+        }
+    }
+
+    function searchTableDebounced() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(searchTable, SEARCH_DEBOUNCE_MS);
+    }
+
+    function toggleSection(element) {
+        const content = element.nextElementSibling;
+        element.classList.toggle('collapsed');
+        content.classList.toggle('collapsed');
+        if (content.classList.contains('collapsed')) return;
+        loadTables(content);
+        for (const table of content.getElementsByTagName('table')) {
+            if (tables[table.id]) renderRows(tables[table.id]);
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('script.table-data').forEach(script => {
+            initTable(document.getElementById(script.dataset.table), JSON.parse(script.textContent));
+        });
+        document.querySelectorAll('.collapsible-content:not(.collapsed)').forEach(loadTables);
+    });
+"""
+REPORT_HEAD = REPORT_META + "<style>\n" + REPORT_STYLE + "</style>\n<script>\n" + REPORT_SCRIPT + "</script>\n</head>\n<body>\n"
+REPORT_SEARCH = """<div class="search-container">
+    <input type="text" id="searchInput" oninput="searchTableDebounced()" placeholder="Search items...">
+</div>
+"""
+REPORT_TAIL = """</div>
+</body>
+</html>
+"""
+# Report output goes through a buffer this large, so rows are written in big chunks
+REPORT_BUFFER_SIZE = 1 << 16
+
+# (heading, sortable as a number) for each column of a report table
+CURRENT_COLUMNS = [("Part", False), ("Product Name", False), ("New Price ($)", True),
+                   ("Old Price ($)", True), ("% Off", True), ("Availability", False)]
+NEW_COLUMNS = [("Part", False), ("Product Name", False), ("New Price ($)", True), ("Date Added", False)]
+PRICE_COLUMNS = [("Part", False), ("Product Name", False), ("Old Price ($)", True),
+                 ("New Price ($)", True), ("Date Changed", False)]
+REMOVED_COLUMNS = [("Part", False), ("Product Name", False), ("Last Known Price ($)", True), ("Date Removed", False)]
+OTHER_COLUMNS = [("Part", False), ("Product Name", False), ("Change", False), ("Old", False),
+                 ("New", False), ("Date Changed", False)]
+
+TABLE_CLOSE = "</tbody></table>\n</div>\n"
+
+def html_text(value):
+    """Escape a value for an HTML text node or attribute"""
+    return escape(str(value))
+
+def script_json(value):
+    """JSON for inside a <script> element: no "<" can end the element early"""
+    return json.dumps(value, ensure_ascii=False).replace("<", "\\u003c")
+
+def table_open(table_id, columns, row_class="", link_column=None, shards=None, shard_key=None):
     """
-    Generate an improved HTML chart with enhanced historical changes section.
-    Enhancements: add part type and date to changes, show change summary in headers, enable sorting.
+    Opening tags and sortable header row of a report table. With shards (URLs of
+    per-site JSON files), the page fetches the table's rows from each file's shard_key.
     """
-    # Get the current date and time for historical changes and title
-    current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-    current_datetime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    table_id = html_text(table_id)
+    headers = "".join(
+        f"<th onclick=\"sortTable('{table_id}', {i}{', true' if numeric else ''})\">{html_text(label)}</th>"
+        for i, (label, numeric) in enumerate(columns)
+    )
+    attrs = f' data-row-class="{html_text(row_class)}"' if row_class else ""
+    if link_column is not None:
+        attrs += f' data-link="{link_column}"'
+    if shards:
+        attrs += f' data-shards="{html_text(" ".join(shards))}" data-shard-key="{html_text(shard_key)}"'
+    return f'<div class="table-viewport">\n<table id="{table_id}"{attrs}>\n<thead><tr>{headers}</tr></thead>\n<tbody>\n'
+
+def write_table(write, table_id, columns, rows, row_class="", link_column=None):
+    """
+    Write an empty table and, after it, the JSON array its rows are rendered from.
+    rows yields one list of cell strings per row; when link_column is set, the cell
+    after the last column is the URL that column links to.
+    """
+    write(table_open(table_id, columns, row_class, link_column))
+    write(TABLE_CLOSE)
+    write(f'<script type="application/json" class="table-data" data-table="{html_text(table_id)}">[')
+    for i, row in enumerate(rows):
+        write(("," if i else "") + script_json(row))
+    write("]</script>\n")
+
+def item_row(item):
+    return [str(item.part), item.name, str(format_cents(item.price_new)),
+            format_cents(item.price_old) if item.price_old else 'N/A',
+            format_percent(item.percent_off), str(item.availability), item.url]
+
+def new_row(change, part, date):
+    item = change["item"]
+    return [str(item.part), item.name, str(format_cents(item.price_new)), date, item.url]
+
+def price_row(change, part, date):
+    return [part, change['name'], str(format_cents(change['old'])), str(format_cents(change['new'])), date, change['url']]
+
+def removed_row(change, part, date):
+    item = change["item"]
+    return [str(item.part), item.name, str(format_cents(item.price_new)), date]
+
+def other_row(change, part, date):
+    # Original price, name and availability changes
+    return [part, change['name'], change["type"].replace("_change", "").replace("_", " ").capitalize(),
+            str(format_change_value(change['type'], change['old'])),
+            str(format_change_value(change['type'], change['new'])), date, change['url']]
+
+# (change group, heading, table id prefix, columns, row class, linked column, row builder)
+# for the tables in each site's change section, in display order
+CHANGE_TABLES = [
+    ("new", "New Items", "historical-new", NEW_COLUMNS, "new", 1, new_row),
+    ("price_change", "Price Changes", "historical-price", PRICE_COLUMNS, "price-change", 1, price_row),
+    ("removed", "Removed Items", "historical-removed", REMOVED_COLUMNS, "removed", None, removed_row),
+    ("other", "Other Changes", "historical-other", OTHER_COLUMNS, "price-change", 1, other_row),
+]
+
+class ReportIndex:
+    """
+    One-pass grouping of a run's data and changes, shared by the summary, the item
+    tables and the change sections:
+      stores:   store -> part -> [Product], in data order
+      changes:  site key -> "new" / "price_change" / "removed" / "other" -> [change]
+      site_ids: site key -> the slug used in its table ids and shard file name
+    """
+    CHANGE_GROUPS = ("new", "price_change", "removed", "other")
 
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Sale Items and Changes</title>
-        <link href="https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700&display=swap" rel="stylesheet">
-        <style>
-            body {{
-                font-family: 'Roboto', sans-serif;
-                margin: 20px;
-                background-color: #f5f7fa;
-                color: #333;
-            }}
-            h1, h2, h3 {{
-                text-align: center;
-                color: #2c3e50;
-            }}
-            h1 {{
-                font-size: 2.2em;
-                margin-bottom: 20px;
-            }}
-            h2 {{
-                font-size: 1.8em;
-                margin-top: 40px;
-            }}
-            h3 {{
-                font-size: 1.4em;
-                margin: 20px 0;
-                cursor: pointer;
-                display: flex;
-                align-items: center;
-                gap: 8px;
-            }}
-            h3::before {{
-                content: '▼';
-                font-size: 0.8em;
-                transition: transform 0.3s;
-            }}
-            h3.collapsed::before {{
-                content: '▶';
-                transform: rotate(0deg);
-            }}
-            .summary {{
-                background-color: #ffffff;
-                padding: 15px;
-                border-radius: 8px;
-                box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-                margin-bottom: 20px;
-                text-align: center;
-            }}
-            .search-container {{
-                margin: 20px 0;
-                text-align: center;
-            }}
-            .search-container input {{
-                padding: 10px;
-                width: 300px;
-                border: 1px solid #ddd;
-                border-radius: 5px;
-                font-size: 1em;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 20px 0;
-                background-color: #ffffff;
-                box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-                border-radius: 8px;
-                overflow: hidden;
-            }}
-            th, td {{
-                padding: 12px;
-                text-align: left;
-                border-bottom: 1px solid #e0e0e0;
-            }}
-            th {{
-                background: linear-gradient(135deg, #3498db, #2980b9);
-                color: white;
-                position: sticky;
-                top: 0;
-                z-index: 1;
-                cursor: pointer;
-                font-weight: 500;
-            }}
-            th:hover {{
-                background: linear-gradient(135deg, #2980b9, #1c5f8a);
-            }}
-            th::after {{
-                content: '';
-                margin-left: 5px;
-                font-size: 0.8em;
-            }}
-            th.asc::after {{
-                content: '↑';
-            }}
-            th.desc::after {{
-                content: '↓';
-            }}
-            tr:nth-child(even) {{
-                background-color: #f9f9f9;
-            }}
-            tr:hover {{
-                background-color: #f1f1f1;
-            }}
-            a {{
-                color: #3498db;
-                text-decoration: none;
-            }}
-            a:hover {{
-                text-decoration: underline;
-            }}
-            .new {{
-                background-color: #e6f7e6;
-            }}
-            .price-change {{
-                background-color: #fff4e1;
-            }}
-            .removed {{
-                background-color: #ffe6e6;
-            }}
-            .section {{
-                margin-bottom: 40px;
-            }}
-            .collapsible-content {{
-                display: block;
-                transition: max-height 0.3s ease-out;
-                overflow: hidden;
-            }}
-            .collapsible-content.collapsed {{
-                display: none;
-            }}
-            @media (max-width: 768px) {{
-                table {{
-                    display: block;
-                    overflow-x: auto;
-                }}
-                th, td {{
-                    min-width: 120px;
-                }}
-            }}
-        </style>
-        <script>
-            function sortTable(tableId, colIndex, isNumeric = false) {{
-                const table = document.getElementById(tableId);
-                let rows = Array.from(table.rows).slice(1);
-                const isAsc = table.rows[0].cells[colIndex].getAttribute('data-sort') !== 'asc';
-                
-                rows.sort((a, b) => {{
-                    let aValue = a.cells[colIndex].innerText.trim();
-                    let bValue = b.cells[colIndex].innerText.trim();
-                    
-                    if (isNumeric) {{
-                        aValue = parseFloat(aValue.replace('$', '').replace('%', '')) || 0;
-                        bValue = parseFloat(bValue.replace('$', '').replace('%', '')) || 0;
-                        return isAsc ? aValue - bValue : bValue - aValue;
-                    }} else {{
-                        return isAsc ? aValue.localeCompare(bValue) : bValue.localeCompare(aValue);
-                    }}
-                }});
-                
-                table.rows[0].cells[colIndex].setAttribute('data-sort', isAsc ? 'asc' : 'desc');
-                for (let i = 0; i < table.rows[0].cells.length; i++) {{
-                    table.rows[0].cells[i].classList.remove('asc', 'desc');
-                }}
-                table.rows[0].cells[colIndex].classList.add(isAsc ? 'asc' : 'desc');
-                
-                const tbody = table.getElementsByTagName('tbody')[0];
-                tbody.innerHTML = '';
-                rows.forEach(row => tbody.appendChild(row));
-            }}
-
-            function searchTable() {{
-                const input = document.getElementById('searchInput').value.toLowerCase();
-                const tables = document.getElementsByTagName('table');
-                
-                for (let table of tables) {{
-                    const rows = table.getElementsByTagName('tr');
-                    for (let i = 1; i < rows.length; i++) {{
-                        const cells = rows[i].getElementsByTagName('td');
-                        let match = false;
-                        for (let cell of cells) {{
-                            if (cell.innerText.toLowerCase().includes(input)) {{
-                                match = true;
-                                break;
-                            }}
-                        }}
-                        rows[i].style.display = match ? '' : 'none';
-                    }}
-                }}
-            }}
-
-            function toggleSection(element) {{
-                const content = element.nextElementSibling;
-                element.classList.toggle('collapsed');
-                content.classList.toggle('collapsed');
-            }}
-        </script>
-    </head>
-    <body>
-        <h1>Skateboard Sale Items and Changes as of {current_datetime}</h1>
+    def __init__(self, data, changes):
+        self.stores = {}
+        self.site_ids = {}
+        for site_key, items in data.items():
+            store, part = site_key.split("_")
+            self.stores.setdefault(store, {})[part] = items
+            self.site_ids[site_key] = site_key.lower().replace('_', '-')
+
+        self.changes = {}
+        for site, site_changes in changes.items():
+            groups = {group: [] for group in self.CHANGE_GROUPS}
+            for change in site_changes:
+                groups.get(change["type"], groups["other"]).append(change)
+            self.changes[site] = groups
+            self.site_ids[site] = site.lower().replace('_', '-')
+
+def render_report(out, index, current_date, head=REPORT_HEAD, shard_urls=None):
     """
+    Write the report to the file-like out, a section and a row at a time. With
+    shard_urls (site key -> URL of its shard), tables are left for the page to fill
+    from the shards, and sections start collapsed so nothing loads until opened.
+    """
+    current_datetime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    collapsed = " collapsed" if shard_urls else ""
+    section_heading = "<h3 class='collapsed' onclick='toggleSection(this)'>" if shard_urls else "<h3 onclick='toggleSection(this)'>"
+    write = out.write
+
+    write(head)
+    write(f"<h1>Skateboard Sale Items and Changes as of {current_datetime}</h1>\n")
 
     # Summary Statistics
-    summary = {}
-    for site_key, items in data.items():
-        store, part = site_key.split("_")
-        if store not in summary:
-            summary[store] = {}
-        summary[store][part] = len(items)
-
-    html_content += "<div class='summary'><h2>Summary</h2>"
-    for store, parts in summary.items():
-        total = sum(parts.values())
-        parts_str = ", ".join([f"{count} {part}" for part, count in parts.items()])
-        html_content += f"<p><strong>{store}</strong>: {total} items ({parts_str})</p>"
-    html_content += "</div>"
-
-    # Search Bar
-    html_content += """
-        <div class="search-container">
-            <input type="text" id="searchInput" onkeyup="searchTable()" placeholder="Search items...">
-        </div>
-    """
+    write("<div class='summary'><h2>Summary</h2>\n")
+    for store, parts in index.stores.items():
+        total = sum(len(items) for items in parts.values())
+        parts_str = ", ".join([f"{len(items)} {part}" for part, items in parts.items()])
+        write(f"<p><strong>{html_text(store)}</strong>: {total} items ({html_text(parts_str)})</p>\n")
+    write("</div>\n")
+    write(REPORT_SEARCH)
 
     # Current Sale Items - Grouped by Store
-    html_content += "<div class='section'><h2>Current Sale Items</h2>"
-    stores = sorted(set(site_key.split("_")[0] for site_key in data.keys()))
-    for store in stores:
-        store_items = []
-        for site_key, items in data.items():
-            if site_key.startswith(store):
-                store_items.extend(items)
-        if not store_items:
+    write("<div class='section'><h2>Current Sale Items</h2>\n")
+    for store in sorted(index.stores):
+        parts = index.stores[store]
+        if not any(parts.values()):
             continue
 
-        html_content += f"<h3 onclick='toggleSection(this)'>{store}</h3>"
-        html_content += f"<div class='collapsible-content'>"
-        html_content += f"<table id='table-{store.lower()}'>"
-        html_content += """
-            <thead>
-                <tr>
-                    <th onclick="sortTable('table-{}', 0)">Part</th>
-                    <th onclick="sortTable('table-{}', 1)">Product Name</th>
-                    <th onclick="sortTable('table-{}', 2, true)">New Price ($)</th>
-                    <th onclick="sortTable('table-{}', 3, true)">Old Price ($)</th>
-                    <th onclick="sortTable('table-{}', 4, true)">% Off</th>
-                    <th onclick="sortTable('table-{}', 5)">Availability</th>
-                </tr>
-            </thead>
-            <tbody>
-        """.format(store.lower(), store.lower(), store.lower(), store.lower(), store.lower(), store.lower())
-
-        for item in store_items:
-            percent_off = calculate_percent_off(item["price_new"], item["price_old"])
-            html_content += f"""
-                <tr>
-                    <td>{item['part']}</td>
-                    <td><a href="{item['url']}" target="_blank">{item['name']}</a></td>
-                    <td>{item['price_new']}</td>
-                    <td>{item['price_old'] if item['price_old'] else 'N/A'}</td>
-                    <td>{percent_off}</td>
-                    <td>{item['availability']}</td>
-                </tr>
-            """
-        html_content += "</tbody></table></div>"
-    html_content += "</div>"
+        write(f"{section_heading}{html_text(store)}</h3>\n"
+              f"<div class='collapsible-content{collapsed}'>\n")
+        table_id = f"table-{store.lower()}"
+        if shard_urls:
+            urls = [shard_urls[f"{store}_{part}"] for part, items in parts.items() if items]
+            write(table_open(table_id, CURRENT_COLUMNS, link_column=1, shards=urls, shard_key="items"))
+            write(TABLE_CLOSE)
+        else:
+            rows = (item_row(item) for items in parts.values() for item in items)
+            write_table(write, table_id, CURRENT_COLUMNS, rows, link_column=1)
+        write("</div>\n")
+    write("</div>\n")
 
     # Historical Changes with Enhanced Details
-    html_content += """
-        <div class="section">
-            <h2>Historical Changes</h2>
+    write('<div class="section">\n<h2>Historical Changes</h2>\n')
+    if not index.changes:
+        write("<p>No changes detected since the last run.</p>\n")
+    for site, groups in index.changes.items():
+        summary_parts = []
+        if groups["new"]:
+            summary_parts.append(f"{len(groups['new'])} New")
+        if groups["price_change"]:
+            summary_parts.append(f"{len(groups['price_change'])} Price Changes")
+        if groups["removed"]:
+            summary_parts.append(f"{len(groups['removed'])} Removed")
+        if groups["other"]:
+            summary_parts.append(f"{len(groups['other'])} Other Changes")
+        summary_text = ", ".join(summary_parts) if summary_parts else "No changes"
+
+        write(f"{section_heading}{html_text(site)} ({summary_text})</h3>\n"
+              f"<div class='collapsible-content{collapsed}'>\n")
+        site_id = index.site_ids[site]
+        part = site.split("_")[1]
+
+        for group, heading, id_prefix, columns, row_class, link_column, build_row in CHANGE_TABLES:
+            site_changes = groups[group]
+            if not site_changes:
+                continue
+            write(f"<h4>{heading}</h4>\n")
+            table_id = f"{id_prefix}-{site_id}"
+            if shard_urls:
+                write(table_open(table_id, columns, row_class, link_column,
+                                 shards=[shard_urls[site]], shard_key=group))
+                write(TABLE_CLOSE)
+            else:
+                rows = (build_row(change, part, current_date) for change in site_changes)
+                write_table(write, table_id, columns, rows, row_class, link_column)
+
+        write("</div>\n")
+
+    write(REPORT_TAIL)
+
+def write_if_changed(path, content):
+    """Atomically replace path with content unless it already holds exactly that"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    atomic_write_file(path, content)
+    return True
+
+# Lists the shards write_report_shards wrote, so only those are ever deleted from REPORT_DATA_DIR
+REPORT_SHARD_MANIFEST = "report-shards.json"
+
+def content_version(content):
+    """Short content hash appended to report asset URLs as ?v=, so browsers refetch changed files"""
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=4).hexdigest()
+
+def write_report_shards(index, data_dir, current_date, unchanged_sites=()):
     """
-    if not changes:
-        html_content += "<p>No changes detected since the last run.</p>"
-    else:
-        for site, site_changes in changes.items():
-            # Calculate summary of changes
-            new_count = len([c for c in site_changes if c["type"] == "new"])
-            price_change_count = len([c for c in site_changes if c["type"] == "price_change"])
-            removed_count = len([c for c in site_changes if c["type"] == "removed"])
-            summary_parts = []
-            if new_count > 0:
-                summary_parts.append(f"{new_count} New")
-            if price_change_count > 0:
-                summary_parts.append(f"{price_change_count} Price Changes")
-            if removed_count > 0:
-                summary_parts.append(f"{removed_count} Removed")
-            summary_text = ", ".join(summary_parts) if summary_parts else "No changes"
-
-            html_content += f"<h3 onclick='toggleSection(this)'>{site} ({summary_text})</h3>"
-            html_content += "<div class='collapsible-content'>"
-
-            # New Items
-            new_items = [change for change in site_changes if change["type"] == "new"]
-            if new_items:
-                html_content += f"""
-                <h4>New Items</h4>
-                <table id="historical-new-{site.lower().replace('_', '-')}">
-                    <thead>
-                        <tr>
-                            <th onclick="sortTable('historical-new-{site.lower().replace('_', '-')}', 0)">Part</th>
-                            <th onclick="sortTable('historical-new-{site.lower().replace('_', '-')}', 1)">Product Name</th>
-                            <th onclick="sortTable('historical-new-{site.lower().replace('_', '-')}', 2, true)">New Price ($)</th>
-                            <th onclick="sortTable('historical-new-{site.lower().replace('_', '-')}', 3)">Date Added</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                """
-                for change in new_items:
-                    item = change["item"]
-                    html_content += f"""
-                        <tr class="new">
-                            <td>{item['part']}</td>
-                            <td><a href="{item['url']}" target="_blank">{item['name']}</a></td>
-                            <td>{item['price_new']}</td>
-                            <td>{current_date}</td>
-                        </tr>
-                    """
-                html_content += "</tbody></table>"
-
-            # Price Changes
-            price_changes = [change for change in site_changes if change["type"] == "price_change"]
-            if price_changes:
-                html_content += f"""
-                <h4>Price Changes</h4>
-                <table id="historical-price-{site.lower().replace('_', '-')}">
-                    <thead>
-                        <tr>
-                            <th onclick="sortTable('historical-price-{site.lower().replace('_', '-')}', 0)">Part</th>
-                            <th onclick="sortTable('historical-price-{site.lower().replace('_', '-')}', 1)">Product Name</th>
-                            <th onclick="sortTable('historical-price-{site.lower().replace('_', '-')}', 2, true)">Old Price ($)</th>
-                            <th onclick="sortTable('historical-price-{site.lower().replace('_', '-')}', 3, true)">New Price ($)</th>
-                            <th onclick="sortTable('historical-price-{site.lower().replace('_', '-')}', 4)">Date Changed</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                """
-                for change in price_changes:
-                    part = site.split("_")[1]
-                    html_content += f"""
-                        <tr class="price-change">
-                            <td>{part}</td>
-                            <td><a href="{change['url']}" target="_blank">{change['name']}</a></td>
-                            <td>{change['old']}</td>
-                            <td>{change['new']}</td>
-                            <td>{current_date}</td>
-                        </tr>
-                    """
-                html_content += "</tbody></table>"
-
-            # Removed Items
-            removed_items = [change for change in site_changes if change["type"] == "removed"]
-            if removed_items:
-                html_content += f"""
-                <h4>Removed Items</h4>
-                <table id="historical-removed-{site.lower().replace('_', '-')}">
-                    <thead>
-                        <tr>
-                            <th onclick="sortTable('historical-removed-{site.lower().replace('_', '-')}', 0)">Part</th>
-                            <th onclick="sortTable('historical-removed-{site.lower().replace('_', '-')}', 1)">Product Name</th>
-                            <th onclick="sortTable('historical-removed-{site.lower().replace('_', '-')}', 2, true)">Last Known Price ($)</th>
-                            <th onclick="sortTable('historical-removed-{site.lower().replace('_', '-')}', 3)">Date Removed</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                """
-                for change in removed_items:
-                    item = change["item"]
-                    html_content += f"""
-                        <tr class="removed">
-                            <td>{item['part']}</td>
-                            <td>{item['name']}</td>
-                            <td>{item['price_new']}</td>
-                            <td>{current_date}</td>
-                        </tr>
-                    """
-                html_content += "</tbody></table>"
-
-            html_content += "</div>"
-
-    html_content += """
-        </div>
-    </body>
-    </html>
+    Write report.css, report.js and one JSON shard per site key into data_dir, each
+    only if its content changed, and delete shards of sites that are gone. Shards of
+    unchanged_sites with no changes to show are reused without being rebuilt. Returns
+    ({site key: shard file name?v=version}, css version, js version) for the page to link.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    versions = []
+    for name, content in (("report.css", REPORT_STYLE), ("report.js", REPORT_SCRIPT)):
+        write_if_changed(os.path.join(data_dir, name), content)
+        versions.append(content_version(content))
+
+    # {shard file name: version} from the last run; files not listed here are never touched
+    manifest_path = os.path.join(data_dir, REPORT_SHARD_MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous_manifest = json.load(f)
+    except (OSError, ValueError):
+        previous_manifest = {}
+
+    manifest = {}
+    shard_files = {}
+    changed = 0
+    for site_key, site_id in index.site_ids.items():
+        name = f"{site_id}.json"
+        shard_path = os.path.join(data_dir, name)
+        if (site_key in unchanged_sites and site_key not in index.changes
+                and name in previous_manifest and os.path.exists(shard_path)):
+            manifest[name] = previous_manifest[name]
+        else:
+            store, part = site_key.split("_")
+            shard = {"items": [item_row(item) for item in index.stores.get(store, {}).get(part, [])]}
+            groups = index.changes.get(site_key, {})
+            for group, _, _, _, _, _, build_row in CHANGE_TABLES:
+                if groups.get(group):
+                    shard[group] = [build_row(change, part, current_date) for change in groups[group]]
+            content = json.dumps(shard, ensure_ascii=False, separators=(",", ":"))
+            changed += write_if_changed(shard_path, content)
+            manifest[name] = content_version(content)
+        shard_files[site_key] = f"{name}?v={manifest[name]}"
+
+    write_if_changed(manifest_path, json.dumps(manifest, indent=1, sort_keys=True))
+    for name in previous_manifest:
+        if name not in manifest and os.path.basename(name) == name:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(data_dir, name))
+                logging.info(f"Removed stale report shard {name}")
+    logging.info(f"Report shards: {changed} of {len(shard_files)} changed in {data_dir}")
+    return shard_files, versions[0], versions[1]
+
+def write_report(output_file, data, changes, mode, unchanged_sites=()):
+    current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+    index = ReportIndex(data, changes)
+    head = REPORT_HEAD
+    shard_urls = None
+    if mode == "sharded":
+        data_dir = os.path.join(os.path.dirname(output_file), REPORT_DATA_DIR)
+        shard_files, css_version, js_version = write_report_shards(index, data_dir, current_date, unchanged_sites)
+        base = REPORT_DATA_DIR.replace(os.sep, "/").rstrip("/") + "/"
+        shard_urls = {site_key: base + name for site_key, name in shard_files.items()}
+        head = (REPORT_META
+                + f'<link rel="stylesheet" href="{html_text(base)}report.css?v={css_version}">\n'
+                + f'<script src="{html_text(base)}report.js?v={js_version}"></script>\n</head>\n<body>\n')
+
+    with atomic_open(output_file, buffering=REPORT_BUFFER_SIZE) as out:
+        render_report(out, index, current_date, head, shard_urls)
+
+def generate_html_chart(data, changes, output_file="sale_items_chart.html", mode=None, unchanged_sites=()):
     """
+    Stream the HTML report (summary, current items by store, changes by site) into
+    output_file through a buffered writer, replacing it atomically when done.
+    mode overrides REPORT_MODE: "inline" embeds all rows in the page, "sharded"
+    writes them to per-site JSON files under REPORT_DATA_DIR beside it (reusing
+    the files of unchanged_sites).
+    """
+    mode = mode or REPORT_MODE
+    try:
+        write_report(output_file, data, changes, mode, unchanged_sites)
+        logging.info(f"Generated HTML chart at {output_file} ({mode})")
+        return True
+    except OSError as e:
+        logging.error(f"Failed to write HTML chart to {output_file}: {e}")
+
+    # Keep a copy in /tmp so the report isn't lost
+    tmp_filename = os.path.join('/tmp', os.path.basename(output_file))
+    try:
+        write_report(tmp_filename, data, changes, mode, unchanged_sites)
+        logging.info(f"Wrote HTML chart to alternate location: {tmp_filename}")
+    except OSError as tmp_error:
+        logging.error(f"Could not write HTML chart to temp location either: {tmp_error}")
+    return False
 
-    # Save with permission error handling
-    if safe_write_file(output_file, html_content):
-        logging.info(f"Generated HTML chart at {output_file}")
-    else:
-        logging.error(f"Failed to write HTML chart to {output_file}")
+def scrape_all(scrapers, pool, limiter, on_site_done=None):
+    """
+    Run all scrapers concurrently and gather their items by site key, in list order.
+    on_site_done(site_key, items) is called from this thread as each site finishes.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(scrapers)), thread_name_prefix="scraper") as executor:
+        futures = {}
+        for s in scrapers:
+            site_key = f"{s.name}_{s.part}"
+            logging.info(f"Scraping {site_key}")
+            futures[executor.submit(s.scrape, pool, limiter)] = site_key
 
-def main():
+        for future in as_completed(futures):
+            site_key = futures[future]
+            try:
+                results[site_key] = future.result()
+            except Exception as e:
+                logging.error(f"Error scraping {site_key}: {e}")
+                results[site_key] = []
+            logging.info(f"Finished scraping {site_key}: {len(results[site_key])} items")
+            if on_site_done:
+                try:
+                    on_site_done(site_key, results[site_key])
+                except Exception as e:
+                    logging.error(f"Error handling finished site {site_key}: {e}")
+    return {site_key: results[site_key] for site_key in futures.values()}
+
+def print_changes(diffs):
+    if not diffs:
+        print("No changes detected.")
+        return
+    print("Changes detected:")
+    for site, changes in diffs.items():
+        print(f"\n{site}:")
+        for c in changes:
+            if c["type"] == "new":
+                print(f"  New: {c['item'].name} at {format_cents(c['item'].price_new)}")
+            elif c["type"] == "price_change":
+                print(f"  Price change: {format_cents(c['old'])} -> {format_cents(c['new'])} | {c['url']}")
+            elif c["type"] == "removed":
+                print(f"  Removed: {c['item'].name}")
+            else:
+                label = c["type"].replace("_", " ").capitalize()
+                print(f"  {label}: {format_change_value(c['type'], c['old'])} -> {format_change_value(c['type'], c['new'])} | {c['url']}")
+
+def main(replay_dir=None):
+    """
+    Scrape every site, diff against the previous snapshot and write the report
+    (and price history), unless nothing changed since that snapshot.
+    With replay_dir, pages are read from captures there instead (no browser or
+    network). A replay diffs against and writes its own snapshot and report under
+    replay_dir/replay, and records no price history, change journal or captures.
+    """
     try:
         scrapers = [
             ZumiezScraper("Zumiez", "https://www.zumiez.com/skate/components/wheels.html?customFilters=brand:Bones,OJ%20Wheels,Powell,Spitfire;promotion_flag:Sale", "Wheels"),
@@ -1155,50 +2648,89 @@ def main():
             TacticsDecksScraper(),
         ]
 
-        current = {}
+        replay = ReplaySource(replay_dir) if replay_dir else None
         for s in scrapers:
-            site_key = f"{s.name}_{s.part}"
-            logging.info(f"Scraping {site_key}")
-            current[site_key] = s.scrape()
-            logging.info(f"Finished scraping {site_key}: {len(current[site_key])} items")
+            s.replay = replay
+
+        if replay is None:
+            snapshot_file, report_file = SNAPSHOT_FILE, "sale_items_chart.html"
+        else:
+            output_dir = os.path.join(replay_dir, "replay")
+            os.makedirs(output_dir, exist_ok=True)
+            snapshot_file = os.path.join(output_dir, os.path.basename(SNAPSHOT_FILE))
+            report_file = os.path.join(output_dir, "sale_items_chart.html")
+
+        # Stream each site to the new snapshot as it finishes, so a run that dies
+        # halfway still leaves what it scraped on disk
+        try:
+            snapshot = SnapshotWriter(snapshot_file)
+        except OSError as e:
+            logging.error(f"Could not open snapshot for streaming, saving at the end instead: {e}")
+            snapshot = None
+
+        with (DriverPool() if replay is None else contextlib.nullcontext()) as pool:
+            current = scrape_all(scrapers, pool, HostLimiter(),
+                                 on_site_done=snapshot.write_site if snapshot else None)
 
         for site, items in current.items():
             print(f"{site}: {len(items)} items scraped")
 
-        combined_data = {}
-        for site_key, items in current.items():
-            store, part = site_key.split("_")
-            combined_items = []
-            for item in items:
-                item["store"] = store
-            combined_items.extend(items)
-            combined_data[site_key] = combined_items
-
-        previous = load_previous()
-        diffs = compare(previous, combined_data)
-        if diffs:
-            print("Changes detected:")
-            for site, changes in diffs.items():
-                print(f"\n{site}:")
-                for c in changes:
-                    if c["type"] == "new":
-                        print(f"  New: {c['item']['name']} at {c['item']['price_new']}")
-                    elif c["type"] == "price_change":
-                        print(f"  Price change: {c['old']} -> {c['new']} | {c['url']}")
-                    elif c["type"] == "removed":
-                        print(f"  Removed: {c['item']['name']}")
+        # Products already carry their store, set by the scraper that parsed them
+        combined_data = {site_key: list(items) for site_key, items in current.items()}
+
+        # Nothing to render or save if every site fingerprints the same as the snapshot on disk
+        fingerprints = run_fingerprint(combined_data)
+        previous = load_previous(snapshot_file)
+        previous_fingerprints = getattr(previous, "fingerprints", {})
+        if fingerprints == previous_fingerprints:
+            print("No changes detected (run fingerprint unchanged); skipping report, snapshot and debug writes.")
+            if snapshot:
+                snapshot.discard()
         else:
-            print("No changes detected.")
+            unchanged = {site for site, fingerprint in fingerprints.items() if previous_fingerprints.get(site) == fingerprint}
+            diffs = compare(previous, combined_data, unchanged)
+            print_changes(diffs)
+
+            # Pages are only captured for sites whose items changed
+            if replay is None:
+                write_change_journal(diffs)
+                save_captures(scrapers, combined_data, skip_sites=unchanged)
+
+            generate_html_chart(combined_data, diffs, output_file=report_file, unchanged_sites=unchanged)
+            if snapshot:
+                snapshot.commit(fingerprints)
+            else:
+                save_current(combined_data, snapshot_file)
 
-        generate_html_chart(combined_data, diffs)
-        save_current(combined_data)
+            # Prices are a step function: a site whose items didn't change adds nothing to its history
+            if replay is None:
+                try:
+                    with PriceHistory() as history:
+                        history.record({site: items for site, items in combined_data.items() if site not in unchanged})
+                except sqlite3.Error as e:
+                    logging.error(f"Error recording price history: {e}")
         
     except Exception as e:
         logging.error(f"Error in main function: {e}")
         # Try to save what we have
-        if 'combined_data' in locals() and combined_data:
+        if 'snapshot' in locals() and snapshot and not snapshot.closed and snapshot.sites_written:
+            # Carry the sites this run didn't finish over from the last snapshot, so the
+            # next run doesn't report their items as removed (and re-added after that)
+            logging.info(f"Attempting to save partial data ({snapshot.sites_written} sites)...")
+            try:
+                snapshot.fill_from(load_previous(snapshot_file))
+                snapshot.commit()
+            except Exception as save_error:
+                logging.error(f"Could not save partial data, keeping the last snapshot: {save_error}")
+                snapshot.close()
+        elif 'combined_data' in locals() and combined_data:
             logging.info("Attempting to save partial data...")
-            save_current(combined_data)
+            save_current(combined_data, snapshot_file)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape skateboard sale items and report what changed")
+    parser.add_argument("--replay", metavar="CAPTURE_DIR",
+                        help="parse pages recorded in CAPTURE_DIR (a capture store, or a directory of "
+                             "*_debug_*.html files) instead of fetching them")
+    args = parser.parse_args()
+    main(replay_dir=args.replay)
\ No newline at end of file